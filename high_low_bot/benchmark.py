@@ -0,0 +1,300 @@
+import os
+import sys
+import json
+import mmap
+import time
+import random
+import struct
+import asyncio
+import argparse
+import resource
+import tempfile
+from functools import partial
+import high_low_bot as hlb  # Sets up logging and the import path for shared/
+from levels import LevelStore
+from bootstrap import fetch_all_klines
+from thresholds import ThresholdEngine
+from streams import StreamConnection, StreamMultiplexer
+from ranking import SymbolRanker
+from dispatcher import AlertDispatcher
+from decoding import DECODERS, get_decoder
+from config import BINANCE_API_KEY, BINANCE_API_SECRET, BINANCE_FUTURES_URL
+from shared.transport import create_client
+from shared.metrics import metrics
+
+# Records raw stream frames to disk and replays them through the real alert path
+# (frame decoding, handle_event, evaluate_trades, AlertDispatcher) with a fake Telegram sender.
+#
+# Recording format: HEADER with the metadata length, the metadata as JSON (symbols and the
+# kline rows the levels are seeded from), then one FRAME header plus the raw frame per message
+MAGIC = b'HLREC1'
+HEADER = struct.Struct('<6sI')  # Magic, metadata length
+FRAME = struct.Struct('<QI')  # Nanoseconds since the recording started, frame length
+REPLAY_BATCH = 64  # Frames handed over between event loop turns at max speed, like a busy socket
+SAMPLES = 200000  # Latency samples kept per stage for the quantiles
+DRAIN_TIMEOUT = 10  # Seconds to wait for the dispatcher to send the last alerts
+KLINE_PUSH_INTERVAL = 0.25  # Seconds between kline updates of a symbol on the futures stream
+
+class RecordWriter:
+    def __init__(self, path, metadata):
+        self.file = open(path, 'wb')
+        encoded = json.dumps(metadata).encode()
+        self.file.write(HEADER.pack(MAGIC, len(encoded)))
+        self.file.write(encoded)
+        self.started = time.monotonic_ns()
+        self.frames = 0
+
+    # Append one frame, stamped now unless an offset in nanoseconds is given
+    def write(self, frame, offset=None):
+        data = frame.encode() if isinstance(frame, str) else frame
+        if offset is None:
+            offset = time.monotonic_ns() - self.started
+        self.file.write(FRAME.pack(offset, len(data)))
+        self.file.write(data)
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+
+# Memory mapped reader yielding (offset in nanoseconds, raw frame)
+class Recording:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, length = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a stream recording")
+        self.metadata = json.loads(self.map[HEADER.size:HEADER.size + length])
+        self.start = HEADER.size + length
+
+    def __iter__(self):
+        position = self.start
+        end = len(self.map)
+        while position < end:
+            offset, length = FRAME.unpack_from(self.map, position)
+            position += FRAME.size
+            yield offset, self.map[position:position + length]
+            position += length
+
+    def close(self):
+        self.map.close()
+
+# Stream connection that hands the raw frame to its handler instead of the decoded event
+class RecordingConnection(StreamConnection):
+    def dispatch(self, msg):
+        self.handler(msg)
+
+class RecordingMultiplexer(StreamMultiplexer):
+    connection_class = RecordingConnection
+
+# Telegram stand-in that counts what the dispatcher sends
+class FakeBot:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.messages = 0
+        self.alerts = 0
+
+    async def send_message(self, chat_id, text):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.messages += 1
+        self.alerts += text.count('\n') + 1
+
+# Alert queue that counts everything the threshold check emits
+class CountingQueue(asyncio.Queue):
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+
+    def put_nowait(self, item):
+        self.count += 1
+        super().put_nowait(item)
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Kline rows trimmed to the columns seed_window reads, open time, open, high and low
+def trim_klines(klines):
+    return {symbol: [row[:4] for row in rows] for symbol, rows in klines.items()}
+
+async def record(args):
+    client = await create_client(BINANCE_API_KEY, BINANCE_API_SECRET, futures_url=BINANCE_FUTURES_URL)
+    try:
+        symbols = args.symbols or await SymbolRanker(
+            client, args.top, hlb.QUOTE_ASSET, hlb.EXCLUDED_SYMBOLS, hlb.EXCHANGE_INFO_TTL
+        ).top_symbols()
+        klines = await fetch_all_klines(client, symbols, hlb.WINDOW_INTERVAL, hlb.WINDOW_SIZE)
+    finally:
+        await client.close_connection()
+
+    writer = RecordWriter(args.output, {'symbols': symbols, 'klines': trim_klines(klines), 'recorded_at': time.time()})
+    streams = RecordingMultiplexer(hlb.STREAM_URL, hlb.STREAM_TYPES, hlb.STREAMS_PER_CONNECTION // len(hlb.STREAM_TYPES), writer.write)
+    try:
+        await streams.set_symbols(symbols)
+        print(f"Recording {len(symbols)} symbols for {args.seconds}s to {args.output}")
+        await asyncio.sleep(args.seconds)
+    finally:
+        await streams.close()
+        writer.close()
+    print(f"Recorded {writer.frames} frames, {os.path.getsize(args.output) / 1e6:.1f} MB")
+
+# Synthetic recording: random walk trades skewed towards the first symbols, with kline updates
+def generate(args):
+    rng = random.Random(args.seed)
+    symbols = [f"SYM{i:03d}USDT" for i in range(args.symbols)]
+    weights = [1 / (i + 1) for i in range(args.symbols)]
+    prices = {symbol: rng.uniform(0.1, 1000) for symbol in symbols}
+    bucket_ms = 24 * 3600 * 1000 if hlb.WINDOW_INTERVAL == '1d' else 3600 * 1000
+    now_ms = int(time.time() * 1000)
+    open_time = now_ms - now_ms % bucket_ms
+    klines = {}
+    for symbol, price in prices.items():
+        high, low = price * (1 + args.range), price * (1 - args.range)
+        klines[symbol] = [[open_time - i * bucket_ms, str(price), str(high), str(low)] for i in reversed(range(hlb.WINDOW_SIZE))]
+    days = {symbol: [price, price] for symbol, price in prices.items()}
+
+    writer = RecordWriter(args.output, {'symbols': symbols, 'klines': klines, 'recorded_at': time.time(), 'generated': True})
+    total = int(args.rate * args.seconds)
+    step_ns = 1e9 / args.rate
+    next_kline_ns = 0
+    for i in range(total):
+        offset = int(i * step_ns)
+        timestamp = now_ms + offset // 1000000
+        if offset >= next_kline_ns:
+            for symbol, (high, low) in days.items():
+                kline = {'t': open_time, 'T': open_time + bucket_ms - 1, 's': symbol, 'i': hlb.WINDOW_INTERVAL,
+                         'o': str(prices[symbol]), 'c': str(prices[symbol]), 'h': str(high), 'l': str(low), 'x': False}
+                frame = {'stream': f"{symbol.lower()}@kline_{hlb.WINDOW_INTERVAL}",
+                         'data': {'e': 'kline', 'E': timestamp, 's': symbol, 'k': kline}}
+                writer.write(json.dumps(frame, separators=(',', ':')), offset)
+            next_kline_ns += KLINE_PUSH_INTERVAL * 1e9
+        symbol = rng.choices(symbols, weights)[0]
+        price = prices[symbol] = prices[symbol] * (1 + rng.gauss(0, args.volatility))
+        day = days[symbol]
+        day[0], day[1] = max(day[0], price), min(day[1], price)
+        trade = {'e': 'trade', 'E': timestamp, 'T': timestamp, 's': symbol, 't': i, 'p': f"{price:.8g}",
+                 'q': f"{rng.uniform(0.001, 10):.3f}", 'X': 'MARKET', 'm': rng.random() < 0.5}
+        writer.write(json.dumps({'stream': f"{symbol.lower()}@trade", 'data': trade}, separators=(',', ':')), offset)
+        if args.book:
+            spread = price * args.spread / 2
+            book = {'e': 'bookTicker', 'u': i, 'E': timestamp, 'T': timestamp, 's': symbol,
+                    'b': f"{price - spread:.8g}", 'B': '1.000', 'a': f"{price + spread:.8g}", 'A': '1.000'}
+            writer.write(json.dumps({'stream': f"{symbol.lower()}@bookTicker", 'data': book}, separators=(',', ':')), offset)
+    writer.close()
+    print(f"Generated {writer.frames} frames over {len(symbols)} symbols, {os.path.getsize(args.output) / 1e6:.1f} MB")
+
+def quantiles(name, **labels):
+    summary = metrics.summaries.get((name, tuple(sorted(labels.items()))))
+    if summary is None:
+        return 0.0, 0.0
+    q = summary.quantiles()
+    return q[0.5], q[0.99]
+
+async def replay(args):
+    recording = Recording(args.recording)
+    metrics.samples = args.samples
+    levels_dir = tempfile.TemporaryDirectory()
+    hlb.klines_data = LevelStore(os.path.join(levels_dir.name, hlb.KLINES_FILE))
+    hlb.engine = ThresholdEngine(hlb.FRONTRUN_PERCENTAGE, hlb.NOTIFICATION_DELAY)
+    hlb.windows = {}
+    hlb.confirmer = hlb.new_confirmer()  # Set with CONFIRM_SECONDS / CONFIRM_VOLUME
+    for symbol, rows in recording.metadata['klines'].items():
+        if rows:
+            hlb.seed_window(symbol, rows)
+
+    trades = asyncio.Queue()
+    alerts = CountingQueue()
+    bot = FakeBot(args.send_latency)
+    message_sender = asyncio.create_task(AlertDispatcher(bot, 'benchmark').run(alerts))
+    trade_evaluator = asyncio.create_task(hlb.evaluate_trades(trades, alerts))
+    breakout_checker = asyncio.create_task(hlb.check_breakouts(alerts)) if hlb.confirmer is not None else None
+    decoder = get_decoder(args.decoder)
+    connection = StreamConnection(hlb.STREAM_URL, hlb.STREAM_TYPES, partial(hlb.handle_event, trades), decoder)
+
+    rss_before = peak_rss_mb()
+    frames = 0
+    last_offset = 0
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    for offset, frame in recording:
+        delay = offset / 1e9 / args.speed - (time.perf_counter() - started) if args.speed else 0
+        if delay > 0:
+            await asyncio.sleep(delay)
+        elif frames % args.batch == 0:
+            await asyncio.sleep(0)  # Running behind or at max speed, still let the evaluator in
+        with metrics.timer('replay_dispatch_seconds'):
+            connection.dispatch(frame)
+        frames += 1
+        last_offset = offset
+    while not trades.empty():
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+
+    try:
+        await asyncio.wait_for(alerts.join(), DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"Dispatcher still had {alerts.qsize()} alerts queued after {DRAIN_TIMEOUT}s")
+    trade_evaluator.cancel()
+    message_sender.cancel()
+    if breakout_checker is not None:
+        breakout_checker.cancel()
+    await asyncio.gather(trade_evaluator, message_sender, *filter(None, [breakout_checker]), return_exceptions=True)
+    levels_dir.cleanup()
+    recording.close()
+
+    trades_seen = metrics.counters.get(('trades_total', ()), 0)
+    dispatch_p50, dispatch_p99 = quantiles('replay_dispatch_seconds')
+    check_p50, check_p99 = quantiles('alert_stage_seconds', stage='receive_to_check')
+    recorded_seconds = last_offset / 1e9
+    print(f"Decoder: {decoder.__name__}")
+    print(f"Replayed {frames} frames ({trades_seen} trades, {len(recording.metadata['symbols'])} symbols) in {elapsed:.2f}s")
+    print(f"Throughput: {frames / elapsed:,.0f} events/s, CPU {cpu / elapsed:.0%} of one core")
+    if recorded_seconds > 0:
+        recorded_rate = frames / recorded_seconds
+        print(f"Recorded rate: {recorded_rate:,.0f} events/s over {recorded_seconds:.1f}s, "
+              f"{cpu / recorded_seconds:.0%} of one core at 1x")
+    print(f"Decode and route per event: p50 {dispatch_p50 * 1e6:.1f}us p99 {dispatch_p99 * 1e6:.1f}us")
+    print(f"Receive to threshold check per trade: p50 {check_p50 * 1e6:.1f}us p99 {check_p99 * 1e6:.1f}us")
+    print(f"Alerts: {alerts.count} emitted, {bot.alerts} sent in {bot.messages} messages")
+    if hlb.confirmer is not None:
+        results = {dict(labels)['result']: value for (name, labels), value in metrics.counters.items() if name == 'breakouts_total'}
+        print(f"Breakouts: {results}, {len(hlb.confirmer.pending)} still pending")
+    print(f"Peak RSS: {peak_rss_mb():.1f} MB ({peak_rss_mb() - rss_before:+.1f} MB during replay, mapped recording included)")
+
+def speed(value):
+    return 0.0 if value == 'max' else float(value)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Record stream frames and replay them through the alert path.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="Record live trade and kline frames.")
+    record_parser.add_argument("output", type=str, help="File to write the recording to.")
+    record_parser.add_argument("--seconds", type=float, default=600, help="How long to record.")
+    record_parser.add_argument("--symbols", type=str, nargs='*', help="Symbols to record, the top symbols by volume if omitted.")
+    record_parser.add_argument("--top", type=int, default=hlb.TOP_SYMBOLS, help="Number of top symbols to record.")
+    generate_parser = commands.add_parser("generate", help="Write a synthetic recording.")
+    generate_parser.add_argument("output", type=str, help="File to write the recording to.")
+    generate_parser.add_argument("--symbols", type=int, default=300, help="Number of symbols.")
+    generate_parser.add_argument("--rate", type=float, default=20000, help="Trades per second.")
+    generate_parser.add_argument("--seconds", type=float, default=30, help="Length of the recording.")
+    generate_parser.add_argument("--range", type=float, default=0.01, help="Distance of the levels from the start price, 0.01 = 1%%.")
+    generate_parser.add_argument("--volatility", type=float, default=0.0005, help="Standard deviation of each price step.")
+    generate_parser.add_argument("--book", action='store_true', help="Follow every trade with a bookTicker update.")
+    generate_parser.add_argument("--spread", type=float, default=0.0002, help="Bid/ask spread of the bookTicker updates, 0.0002 = 0.02%%.")
+    generate_parser.add_argument("--seed", type=int, default=0)
+    replay_parser = commands.add_parser("replay", help="Replay a recording through the alert path.")
+    replay_parser.add_argument("recording", type=str, help="Recording to replay.")
+    replay_parser.add_argument("--speed", type=speed, default=1.0, help="Replay speed, 1 for real time, N for N times faster or 'max'.")
+    replay_parser.add_argument("--batch", type=int, default=REPLAY_BATCH, help="Frames between event loop turns at max speed.")
+    replay_parser.add_argument("--send-latency", type=float, default=0.0, help="Seconds the fake Telegram takes to answer.")
+    replay_parser.add_argument("--decoder", type=str, default='auto', choices=['auto', *DECODERS], help="Stream frame decoder.")
+    replay_parser.add_argument("--samples", type=int, default=SAMPLES, help="Latency samples kept for the quantiles.")
+    return parser.parse_args()
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.command == "generate":
+        generate(args)
+        sys.exit()
+    asyncio.run(record(args) if args.command == "record" else replay(args))
\ No newline at end of file
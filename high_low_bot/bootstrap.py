@@ -0,0 +1,75 @@
+import time
+import random
+import asyncio
+import logging
+from binance import AsyncClient
+from binance.exceptions import BinanceAPIException
+
+logger = logging.getLogger(__name__)
+
+WEIGHT_LIMIT = 2400  # Futures request weight allowed per minute
+WEIGHT_RESERVE = 400  # Weight left free for everything else using the same key
+MAX_CONCURRENT_REQUESTS = 20
+MAX_RETRIES = 5
+RETRY_DELAY = 0.5  # Base delay in seconds, doubled on every retry
+
+# Keeps request weight spent inside a rolling one minute window under the limit
+class WeightBudget:
+    def __init__(self, limit=WEIGHT_LIMIT - WEIGHT_RESERVE, window=60):
+        self.limit = limit
+        self.window = window
+        self.used = 0
+        self.window_start = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, weight):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now - self.window_start >= self.window:
+                    self.window_start = now
+                    self.used = 0
+                if self.used + weight <= self.limit:
+                    self.used += weight
+                    return
+                await asyncio.sleep(self.window - (now - self.window_start))
+
+# Request weight of a futures klines call for the given limit
+def klines_weight(limit):
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+# Fetch the last `limit` klines of one symbol
+async def fetch_klines(client, symbol, budget, semaphore, interval, limit):
+    for attempt in range(MAX_RETRIES):
+        await budget.acquire(klines_weight(limit))
+        try:
+            async with semaphore:
+                return await client.futures_klines(symbol=symbol, interval=interval, limit=limit)
+        except BinanceAPIException as e:
+            if e.status_code in (418, 429):
+                retry_after = e.response.headers.get('Retry-After')
+                delay = float(retry_after) if retry_after else RETRY_DELAY * 2 ** attempt
+            elif e.status_code >= 500:
+                delay = RETRY_DELAY * 2 ** attempt
+            else:
+                logger.error(f"{symbol} klines request rejected: {e}")
+                return None
+        except Exception as e:
+            delay = RETRY_DELAY * 2 ** attempt
+            logger.warning(f"{symbol} klines request failed: {e}")
+        await asyncio.sleep(delay + random.uniform(0, RETRY_DELAY))
+    logger.error(f"{symbol} klines request failed after {MAX_RETRIES} attempts")
+    return None
+
+# Fetch klines for all symbols concurrently, skipping the ones that keep failing
+async def fetch_all_klines(client, symbols, interval=AsyncClient.KLINE_INTERVAL_1DAY, limit=7, budget=None):
+    budget = budget or WeightBudget()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    results = await asyncio.gather(*(fetch_klines(client, symbol, budget, semaphore, interval, limit) for symbol in symbols))
+    return {symbol: klines for symbol, klines in zip(symbols, results) if klines is not None}
@@ -6,4 +6,19 @@ load_dotenv()
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 CHAT_ID = os.getenv('CHAT_ID')
 BINANCE_API_KEY = os.getenv('BINANCE_API_KEY')
-BINANCE_API_SECRET = os.getenv('BINANCE_API_SECRET')
\ No newline at end of file
+BINANCE_API_SECRET = os.getenv('BINANCE_API_SECRET')
+# Endpoints, only changed to run against the local simulator
+BINANCE_FUTURES_URL = os.getenv('BINANCE_FUTURES_URL')
+BINANCE_STREAM_URL = os.getenv('BINANCE_STREAM_URL', 'wss://fstream.binance.com')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
+# Stream frame decoder: 'auto' picks msgspec, then orjson, then the json module
+STREAM_DECODER = os.getenv('STREAM_DECODER', 'auto')
+# Local port serving Prometheus metrics, 0 to turn it off
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9101'))
+# Processes the symbols are split over, each with its own streams and checks. 1 runs everything in one process
+SHARDS = int(os.getenv('SHARDS', '1'))
+# Breakout confirmation: hold a level touch back until it lasts this many seconds or trades this much
+# quote volume beyond the threshold, with the bookTicker and rolling VWAP agreeing. 0 and 0 alert on the touch
+CONFIRM_SECONDS = float(os.getenv('CONFIRM_SECONDS', '0'))
+CONFIRM_VOLUME = float(os.getenv('CONFIRM_VOLUME', '0'))
+CONFIRM_WINDOW = float(os.getenv('CONFIRM_WINDOW', '5'))  # Seconds of trades in the rolling VWAP
\ No newline at end of file
@@ -0,0 +1,135 @@
+from shared.metrics import metrics
+
+WINDOW = 5.0  # Seconds of trades in the rolling VWAP
+CAPACITY = 512  # Trades kept per symbol, on busier symbols the VWAP covers less than WINDOW
+TIMEOUT = 60.0  # Seconds a breakout may wait for confirmation before it is dropped
+
+# Fixed size ring of recent trades with running sums, giving a rolling VWAP in O(1) per trade
+class TradeRing:
+    __slots__ = ('times', 'notionals', 'volumes', 'head', 'size', 'notional', 'volume')
+
+    def __init__(self, capacity):
+        self.times = [0.0] * capacity
+        self.notionals = [0.0] * capacity
+        self.volumes = [0.0] * capacity
+        self.head = 0  # Slot the next trade is written to
+        self.size = 0
+        self.notional = 0.0
+        self.volume = 0.0
+
+    def add(self, now, price, quantity, window):
+        if self.size == len(self.times):
+            self.drop_oldest()
+        i = self.head
+        notional = price * quantity
+        self.times[i] = now
+        self.notionals[i] = notional
+        self.volumes[i] = quantity
+        self.head = (i + 1) % len(self.times)
+        self.size += 1
+        self.notional += notional
+        self.volume += quantity
+        self.expire(now - window)
+
+    def drop_oldest(self):
+        i = (self.head - self.size) % len(self.times)
+        self.size -= 1
+        if self.size:
+            self.notional -= self.notionals[i]
+            self.volume -= self.volumes[i]
+        else:
+            self.notional = self.volume = 0.0  # Don't let rounding errors pile up
+
+    def expire(self, cutoff):
+        while self.size and self.times[(self.head - self.size) % len(self.times)] < cutoff:
+            self.drop_oldest()
+
+    def vwap(self):
+        return self.notional / self.volume if self.volume > 0 else None
+
+# A level touch waiting to prove itself
+class Breakout:
+    __slots__ = ('symbol', 'side', 'threshold', 'price', 'event_time', 'started', 'volume')
+
+    def __init__(self, symbol, side, threshold, price, event_time, started):
+        self.symbol = symbol
+        self.side = side
+        self.threshold = threshold
+        self.price = price
+        self.event_time = event_time
+        self.started = started
+        self.volume = 0.0  # Quote volume traded beyond the threshold since the touch
+
+    def beyond(self, price):
+        return price >= self.threshold if self.side == 'high' else price <= self.threshold
+
+# Holds back level touches until the breakout has lasted `hold_seconds` or traded `hold_volume`
+# beyond the threshold, with the rolling VWAP beyond it too. It is dropped as soon as the far side
+# of the book (the ask for a high, the bid for a low) moves back inside the range.
+class BreakoutConfirmer:
+    def __init__(self, hold_seconds, hold_volume, window=WINDOW, capacity=CAPACITY, timeout=TIMEOUT):
+        self.hold_seconds = hold_seconds
+        self.hold_volume = hold_volume
+        self.window = window
+        self.capacity = capacity
+        self.timeout = timeout
+        self.rings = {}  # Symbol -> TradeRing
+        self.books = {}  # Symbol -> (best bid, best ask)
+        self.pending = {}  # Symbol -> Breakout
+
+    def add_trade(self, symbol, price, quantity, now):
+        ring = self.rings.get(symbol)
+        if ring is None:
+            ring = self.rings[symbol] = TradeRing(self.capacity)
+        ring.add(now, price, quantity, self.window)
+        breakout = self.pending.get(symbol)
+        if breakout is not None and breakout.beyond(price):
+            breakout.volume += price * quantity
+
+    def update_book(self, symbol, bid, ask):
+        self.books[symbol] = (bid, ask)
+        breakout = self.pending.get(symbol)
+        if breakout is not None and not self.book_holds(breakout, bid, ask):
+            del self.pending[symbol]
+            metrics.inc('breakouts_total', result='rejected')
+
+    def book_holds(self, breakout, bid, ask):
+        return breakout.beyond(ask if breakout.side == 'high' else bid)
+
+    # Start tracking a level touch, unless the symbol already has one pending
+    def start(self, symbol, side, threshold, price, event_time, now):
+        if symbol in self.pending:
+            return
+        breakout = Breakout(symbol, side, threshold, price, event_time, now)
+        book = self.books.get(symbol)
+        if book is not None and not self.book_holds(breakout, *book):
+            return
+        self.pending[symbol] = breakout
+
+    # Breakouts that have held long enough, removed from the pending ones
+    def confirmed(self, now):
+        confirmed = []
+        for symbol, breakout in list(self.pending.items()):
+            held = now - breakout.started
+            if held > self.timeout:
+                del self.pending[symbol]
+                metrics.inc('breakouts_total', result='expired')
+                continue
+            if not ((self.hold_seconds and held >= self.hold_seconds)
+                    or (self.hold_volume and breakout.volume >= self.hold_volume)):
+                continue
+            ring = self.rings.get(symbol)
+            if ring is not None:
+                ring.expire(now - self.window)
+            vwap = ring.vwap() if ring is not None else None
+            if vwap is None or not breakout.beyond(vwap):
+                continue
+            del self.pending[symbol]
+            metrics.inc('breakouts_total', result='confirmed')
+            confirmed.append(breakout)
+        return confirmed
+
+    def remove(self, symbol):
+        self.rings.pop(symbol, None)
+        self.books.pop(symbol, None)
+        self.pending.pop(symbol, None)
\ No newline at end of file
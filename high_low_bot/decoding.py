@@ -0,0 +1,109 @@
+import json
+import logging
+from typing import Any, Optional, Union
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Stream frames are decoded into small tuples holding only the fields the bot reads:
+#   (TRADE, symbol, price, quantity, trade time in ms)
+#   (KLINE, symbol, open time in ms, high, low)
+#   (BOOK, symbol, best bid, best ask)
+#   (ERROR, request id, error) for a rejected SUBSCRIBE/UNSUBSCRIBE
+# Anything else, such as subscription acknowledgements, decodes to None.
+TRADE = 'trade'
+KLINE = 'kline'
+BOOK = 'book'
+ERROR = 'error'
+
+# Pick fields out of an already parsed frame, used by the json and orjson decoders
+def from_dict(frame):
+    data = frame.get('data')
+    if data is None:
+        error = frame.get('error')
+        return (ERROR, frame.get('id'), error) if error else None
+    kind = data.get('e')
+    if kind == 'trade':
+        return TRADE, data['s'], float(data['p']), float(data['q']), data['T']
+    if kind == 'bookTicker':
+        return BOOK, data['s'], float(data['b']), float(data['a'])
+    if kind == 'kline':
+        k = data['k']
+        return KLINE, data['s'], k['t'], float(k['h']), float(k['l'])
+    return None
+
+def decode_json(msg):
+    return from_dict(json.loads(msg))
+
+def decode_orjson(msg):
+    return from_dict(orjson.loads(msg))
+
+if msgspec is not None:
+    # Typed shapes of the events we subscribe to, every other field is skipped while parsing
+    class TradeData(msgspec.Struct, tag_field='e', tag='trade'):
+        s: str
+        p: float
+        q: float
+        T: int
+
+    class BookTickerData(msgspec.Struct, tag_field='e', tag='bookTicker'):
+        s: str
+        b: float
+        a: float
+
+    class KlineBar(msgspec.Struct):
+        t: int
+        h: float
+        l: float
+
+    class KlineData(msgspec.Struct, tag_field='e', tag='kline'):
+        s: str
+        k: KlineBar
+
+    class Frame(msgspec.Struct):
+        data: Optional[Union[TradeData, BookTickerData, KlineData]] = None
+        error: Any = None
+        id: Any = None
+
+    # strict=False lets the price strings Binance sends decode straight into floats
+    frame_decoder = msgspec.json.Decoder(Frame, strict=False)
+
+    def decode_msgspec(msg):
+        try:
+            frame = frame_decoder.decode(msg)
+        except msgspec.ValidationError:
+            return decode_json(msg)  # An event shape we have no struct for
+        data = frame.data
+        if data is None:
+            return (ERROR, frame.id, frame.error) if frame.error else None
+        if type(data) is TradeData:
+            return TRADE, data.s, data.p, data.q, data.T
+        if type(data) is BookTickerData:
+            return BOOK, data.s, data.b, data.a
+        k = data.k
+        return KLINE, data.s, k.t, k.h, k.l
+
+DECODERS = {
+    'msgspec': decode_msgspec if msgspec is not None else None,
+    'orjson': decode_orjson if orjson is not None else None,
+    'json': decode_json,
+}
+
+# Fastest available decoder, or the named one when it is installed
+def get_decoder(name='auto'):
+    if name != 'auto':
+        if DECODERS.get(name) is not None:
+            return DECODERS[name]
+        logger.warning(f"Stream decoder {name} is not available, picking one automatically")
+    for decoder in DECODERS.values():
+        if decoder is not None:
+            return decoder
\ No newline at end of file
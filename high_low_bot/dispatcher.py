@@ -0,0 +1,123 @@
+import time
+import asyncio
+import logging
+from telegram.error import TelegramError, RetryAfter
+from shared.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+COALESCE_WINDOW = 1.0  # Seconds to gather alerts into one message
+MAX_ALERT_AGE = 120  # Alerts older than this when their turn comes are dropped
+MAX_RETRIES = 3
+RETRY_DELAY = 2  # Seconds, doubled on every retry
+CHAT_RATE = 1.0  # Messages per second Telegram allows in one chat
+CHAT_BURST = 3
+MAX_MESSAGE_LENGTH = 4096
+
+# Token bucket that keeps us under Telegram's per-chat message limit
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    # Empty the bucket for `seconds` after Telegram asks us to back off
+    def pause(self, seconds):
+        self.tokens = -seconds * self.rate
+        self.updated = time.monotonic()
+
+# Sends queued alerts, merging the ones that arrive close together into a single message
+class AlertDispatcher:
+    def __init__(self, bot, chat_id):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.bucket = TokenBucket(CHAT_RATE, CHAT_BURST)
+
+    async def collect(self, queue):
+        batch = [await queue.get()]
+        deadline = time.monotonic() + COALESCE_WINDOW
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        while not queue.empty():
+            batch.append(queue.get_nowait())
+        return batch
+
+    # Drop stale alerts and repeats of the same symbol and side
+    def merge(self, batch):
+        now = time.time()
+        alerts = {}
+        for message, symbol, alert_type, created, event_time in batch:
+            if now - created > MAX_ALERT_AGE:
+                logger.warning(f"{symbol} {alert_type} alert dropped, {now - created:.0f}s old")
+                metrics.inc('alerts_dropped_total')
+                continue
+            alerts.setdefault((symbol, alert_type), (message, created, event_time))
+        return alerts
+
+    # Split merged alerts into messages that fit Telegram's length limit
+    def chunks(self, alerts):
+        lines, keys, length = [], [], 0
+        for key, (message, _, _) in alerts.items():
+            if lines and length + len(message) + 1 > MAX_MESSAGE_LENGTH:
+                yield '\n'.join(lines), keys
+                lines, keys, length = [], [], 0
+            lines.append(message)
+            keys.append(key)
+            length += len(message) + 1
+        if lines:
+            yield '\n'.join(lines), keys
+
+    async def send(self, text):
+        for attempt in range(MAX_RETRIES):
+            await self.bucket.acquire()
+            try:
+                with metrics.timer('telegram_send_seconds'):
+                    await self.bot.send_message(chat_id=self.chat_id, text=text)
+                return True
+            except RetryAfter as e:
+                logger.warning(f"Rate limited. Waiting for {e.retry_after} seconds before retrying.")
+                self.bucket.pause(e.retry_after)
+            except TelegramError as e:
+                logger.error(f"Failed to send alert: {e}")
+                await asyncio.sleep(RETRY_DELAY * 2 ** attempt)
+        return False
+
+    # Exchange event -> threshold check -> send -> Telegram ack of one alert
+    def record_stages(self, alert, started, acked):
+        _, created, event_time = alert
+        metrics.observe('alert_stage_seconds', started - created, stage='check_to_send')
+        metrics.observe('alert_stage_seconds', acked - started, stage='send_to_ack')
+        metrics.observe('alert_stage_seconds', acked - event_time, stage='event_to_ack')
+
+    async def run(self, queue):
+        while True:
+            batch = await self.collect(queue)
+            alerts = self.merge(batch)
+            for text, keys in self.chunks(alerts):
+                started = time.time()
+                sent = await self.send(text)
+                acked = time.time()
+                for symbol, alert_type in keys:
+                    logger.info(f"{symbol} sent {alert_type} alert. {'Success' if sent else 'Fail'}")
+                    metrics.inc('alerts_total', result='sent' if sent else 'failed')
+                    if sent:
+                        self.record_stages(alerts[(symbol, alert_type)], started, acked)
+            for _ in batch:
+                queue.task_done()
@@ -1,18 +1,32 @@
 import os
+import sys
 import json
 import time
 import logging
 import asyncio
-import websockets
 from datetime import datetime, timedelta
+from functools import partial
+from queue import Empty
 from telegram import Bot
-from telegram.error import TelegramError, RetryAfter
-from binance.client import Client
-from config import TELEGRAM_TOKEN, CHAT_ID, BINANCE_API_KEY, BINANCE_API_SECRET
+from telegram.error import TelegramError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.transport import create_client
+from shared.metrics import metrics
 
-# Initialize clients
-bot = Bot(token=TELEGRAM_TOKEN)
-client = Client(BINANCE_API_KEY, BINANCE_API_SECRET)
+from levels import LevelStore
+from bootstrap import fetch_all_klines, WeightBudget, WEIGHT_LIMIT, WEIGHT_RESERVE
+from rolling import RollingWindow
+from thresholds import ThresholdEngine
+from streams import StreamMultiplexer
+from ranking import SymbolRanker
+from dispatcher import AlertDispatcher
+from shards import ShardPool, ShardOutput
+from confirmation import BreakoutConfirmer
+from decoding import TRADE, KLINE, BOOK, get_decoder
+from config import TELEGRAM_TOKEN, CHAT_ID, BINANCE_API_KEY, BINANCE_API_SECRET
+from config import BINANCE_FUTURES_URL, BINANCE_STREAM_URL, TELEGRAM_API_URL, METRICS_PORT, STREAM_DECODER, SHARDS
+from config import CONFIRM_SECONDS, CONFIRM_VOLUME, CONFIRM_WINDOW
 
 # Logging setup
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%H:%M:%S')
@@ -20,162 +34,312 @@ logger = logging.getLogger(__name__)
 
 # Disable detailed HTTP request logs for Telegram API
 logging.getLogger('telegram').setLevel(logging.CRITICAL)
+logging.getLogger('httpx').setLevel(logging.WARNING)  # One line per command poll otherwise
 
 # Constants
 SYMBOLS_FILE = 'symbols.json'
 KLINES_FILE = 'klines_data.json'
 UPDATE_INTERVAL = 6 * 3600  # 6 hours in seconds
+TOP_SYMBOLS = 50  # Number of symbols watched, ranked by 24h futures quote volume
+QUOTE_ASSET = 'USDT'
+EXCLUDED_SYMBOLS = ['USDCUSDT']
+EXCHANGE_INFO_TTL = 24 * 3600  # Seconds before the tradable symbol list is reloaded
+WINDOW_INTERVAL = '1d'  # Kline stream feeding the rolling levels, '1d' or '1h'
+WINDOW_SIZE = 7  # Klines in the rolling range, use 7 * 24 with '1h'
 NOTIFICATION_DELAY = 60 * 60  # 1 hour in seconds
 FRONTRUN_PERCENTAGE = 0.001  # 0.1%
-MAX_CONCURRENT_CONNECTIONS = 50  # Limit the number of concurrent connections
-MESSAGE_THROTTLE = 2  # Seconds to wait before retrying
-MESSAGE_QUEUE_DELAY = 0.5  # Seconds between processing messages in the queue
-
-# Function to fetch top 50 market cap symbols from Binance Futures based on trading volume
-def fetch_top_50_symbols():
-    all_symbols = client.futures_exchange_info()
-    usdt_pairs = [s['symbol'] for s in all_symbols['symbols'] if s['quoteAsset'] == 'USDT']
-    usdt_pairs = [pair for pair in usdt_pairs if pair != 'USDCUSDT']  # Skip USDCUSDT
-    tickers = client.get_ticker()
-    sorted_tickers = sorted(
-        [ticker for ticker in tickers if ticker['symbol'] in usdt_pairs],
-        key=lambda x: float(x['quoteVolume']),
-        reverse=True
-    )
-    top_50_symbols = [ticker['symbol'] for ticker in sorted_tickers[:50]]
-    return top_50_symbols
+STREAM_URL = f'{BINANCE_STREAM_URL}/stream'
+STREAMS_PER_CONNECTION = 200  # Binance allows up to 200 streams on one combined connection
+STREAM_TYPES = ['trade', f'kline_{WINDOW_INTERVAL}']  # Streams subscribed for every symbol
+if CONFIRM_SECONDS or CONFIRM_VOLUME:
+    STREAM_TYPES.append('bookTicker')  # Best bid/ask, used to reject breakouts that fall back
+CONFIRM_TICK = 0.1  # Seconds between checks of pending breakouts when no trades arrive
+COMMAND_POLL_TIMEOUT = 30  # Seconds Telegram holds a getUpdates call open waiting for commands
+SHARD_POLL_INTERVAL = 1  # Seconds between checks of a shard for a new symbol list
+kline_budget = None  # Weight budget for seeding klines, shards get a share of the limit
+confirmer = None  # BreakoutConfirmer when alerts wait for confirmation
 
 # Load or initialize symbols
-def load_symbols():
+async def load_symbols():
     if os.path.exists(SYMBOLS_FILE):
         with open(SYMBOLS_FILE, 'r') as f:
             return json.load(f)
     else:
-        symbols = fetch_top_50_symbols()
-        with open(SYMBOLS_FILE, 'w') as f:
-            json.dump(symbols, f)
-        return symbols
+        return await update_symbols()
 
 # Update symbols file every 6 hours
-def update_symbols():
-    symbols = fetch_top_50_symbols()
+async def update_symbols():
+    symbols = await ranker.top_symbols()
     with open(SYMBOLS_FILE, 'w') as f:
         json.dump(symbols, f)
     return symbols
 
-# Load or initialize klines data
-def load_klines():
-    if os.path.exists(KLINES_FILE):
-        with open(KLINES_FILE, 'r') as f:
-            return json.load(f)
-    else:
-        return {}
+# Start watching a symbol's rolling window, publishing its levels and saving it for a restart
+def add_window(symbol, window):
+    windows[symbol] = window
+    engine.set_levels(symbol, window.high, window.low)
+    klines_data[symbol] = window.state()
 
-# Update klines data if needed
-def update_klines(klines_data, symbols):
-    now = time.time()
-    if 'last_update' in klines_data and now - klines_data['last_update'] < UPDATE_INTERVAL:
-        return klines_data
+# Build a symbol's rolling window from REST kline rows and publish its levels
+def seed_window(symbol, rows):
+    window = RollingWindow(WINDOW_SIZE, WINDOW_INTERVAL)
+    for k in rows:
+        window.update(k[0], float(k[2]), float(k[3]))
+    add_window(symbol, window)
 
+# Seed rolling windows for symbols that don't have one yet, from the levels file
+# when it was saved in the current kline bucket and from REST klines otherwise
+async def seed_windows(symbols):
+    missing = []
     for symbol in symbols:
-        klines = client.futures_klines(symbol=symbol, interval=Client.KLINE_INTERVAL_1DAY, limit=7)
-        high = max(float(k[2]) for k in klines)
-        low = min(float(k[3]) for k in klines)
-        klines_data[symbol] = {'high': high, 'low': low}
-
-    klines_data['last_update'] = now
-    with open(KLINES_FILE, 'w') as f:
-        json.dump(klines_data, f)
-    return klines_data
-
-# Send message to Telegram with retry logic
-async def send_message(queue):
+        if symbol in windows:
+            continue
+        window = RollingWindow.restore(klines_data.get(symbol), WINDOW_SIZE, WINDOW_INTERVAL)
+        if window is None:
+            missing.append(symbol)
+        else:
+            add_window(symbol, window)
+    if not missing:
+        return
+
+    klines = await fetch_all_klines(async_client, missing, WINDOW_INTERVAL, WINDOW_SIZE, kline_budget)
+    for symbol, rows in klines.items():
+        if rows:
+            seed_window(symbol, rows)
+    logger.info(f"Seeded rolling levels for {len(klines)}/{len(missing)} symbols")
+
+# Roll a symbol's window forward with a kline stream update
+def update_window(symbol, open_time, high, low):
+    window = windows.get(symbol)
+    if window is None:
+        return
+    before = (window.current, window.high, window.low)
+    window.update(open_time, high, low)
+    if (window.current, window.high, window.low) != before:
+        engine.set_levels(symbol, window.high, window.low)
+        klines_data[symbol] = window.state()  # Saved when a bucket rolls or the levels move
+
+# Breakout confirmer for the CONFIRM_* settings, None when alerts go out on the first touch
+def new_confirmer():
+    if not (CONFIRM_SECONDS or CONFIRM_VOLUME):
+        return None
+    return BreakoutConfirmer(CONFIRM_SECONDS, CONFIRM_VOLUME, CONFIRM_WINDOW)
+
+async def publish(queue, symbol, alert_type, now, event_time):
+    await queue.put((f"{symbol} {alert_type.capitalize()}!", symbol, alert_type, now, event_time))
+
+# Alert the breakouts that have held, starting their cooldowns only now
+async def confirm_breakouts(queue, now):
+    for breakout in confirmer.confirmed(now):
+        engine.commit(breakout.symbol, breakout.side, now)
+        await publish(queue, breakout.symbol, breakout.side, now, breakout.event_time)
+
+# Confirm breakouts by time while their symbols are quiet
+async def check_breakouts(queue):
+    while True:
+        await asyncio.sleep(CONFIRM_TICK)
+        await confirm_breakouts(queue, time.time())
+
+# Check buffered trades against the 7 day levels in batches
+async def evaluate_trades(trades, queue):
+    while True:
+        batch = [await trades.get()]
+        while not trades.empty():
+            batch.append(trades.get_nowait())
+
+        slots = []
+        prices = []
+        received_at = []
+        event_times = {}  # Symbol -> exchange time of its latest trade in the batch
+        for symbol, price, quantity, event_time, received in batch:
+            slot = engine.ids.get(symbol)
+            if slot is not None:
+                if confirmer is not None:
+                    confirmer.add_trade(symbol, price, quantity, received)
+                slots.append(slot)
+                prices.append(price)
+                received_at.append(received)
+                event_times[symbol] = event_time
+        metrics.inc('trades_total', len(batch))
+        if not slots:
+            continue
+
+        with metrics.timer('threshold_check_seconds'):
+            alerts = engine.evaluate(slots, prices, time.time(), commit=confirmer is None)
+        now = time.time()
+        for received in received_at:
+            metrics.observe('alert_stage_seconds', now - received, stage='receive_to_check')
+        if confirmer is None:
+            for symbol, alert_type, price in alerts:
+                await publish(queue, symbol, alert_type, now, event_times[symbol])
+            continue
+        for symbol, alert_type, price in alerts:
+            confirmer.start(symbol, alert_type, engine.threshold(symbol, alert_type), price, event_times[symbol], now)
+        await confirm_breakouts(queue, now)
+
+# Route a decoded stream event, buffering trades and rolling the level windows
+def handle_event(trades, event):
+    if event[0] == TRADE:
+        _, symbol, price, quantity, trade_time = event
+        received = time.time()
+        event_time = trade_time / 1000
+        metrics.observe('alert_stage_seconds', received - event_time, stage='event_to_receive')
+        trades.put_nowait((symbol, price, quantity, event_time, received))
+    elif event[0] == KLINE:
+        update_window(*event[1:])
+    elif event[0] == BOOK and confirmer is not None:
+        confirmer.update_book(*event[1:])
+
+# Move the watched symbols to a new universe without touching unchanged ones
+async def apply_universe(streams, symbols):
+    await seed_windows(symbols)  # Levels must be ready before the first trade arrives
+    added, removed = await streams.set_symbols([symbol for symbol in symbols if symbol in windows])
+    klines_data.prune(set(symbols))
+    for symbol in removed:
+        engine.remove(symbol)
+        windows.pop(symbol, None)
+        if confirmer is not None:
+            confirmer.remove(symbol)
+    logger.info(f"Watching {len(streams.assigned)} symbols over {len(streams.connections)} connection(s), +{len(added)} -{len(removed)}")
+
+# Answer /stats in the alert chat, long polling Telegram for new messages
+async def answer_commands():
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=COMMAND_POLL_TIMEOUT, allowed_updates=['message', 'channel_post'])
+        except TelegramError as e:
+            logger.error(f"Failed to fetch Telegram updates: {e}")
+            await asyncio.sleep(COMMAND_POLL_TIMEOUT)
+            continue
+        for update in updates:
+            offset = update.update_id + 1
+            message = update.effective_message
+            if message is None or not message.text or str(message.chat_id) != str(CHAT_ID):
+                continue
+            if message.text.split()[0].split('@')[0].lower() == '/stats':
+                try:
+                    await bot.send_message(chat_id=CHAT_ID, text=metrics.report('high_low_bot'))
+                except TelegramError as e:
+                    logger.error(f"Failed to send stats: {e}")
+
+# The universe to watch now and after every refresh
+async def refreshed_symbols(symbols):
+    yield symbols
     while True:
-        message, symbol, alert_type = await queue.get()
-        while True:
+        try:
+            yield await update_symbols()  # Update symbols every 6 hours
+        except Exception as e:
+            logger.error(f"Failed to refresh symbols: {e}")
+        logger.info(f"Sleeping for {UPDATE_INTERVAL} seconds before updating symbols again...")
+        await asyncio.sleep(UPDATE_INTERVAL)
+
+# Levels, threshold checks and streams for every symbol list `universe` yields, alerts go to `queue`
+async def watch(universe, queue, levels_file=KLINES_FILE):
+    global klines_data
+    klines_data = LevelStore(levels_file)
+    level_writer = asyncio.create_task(klines_data.run())
+
+    global engine
+    engine = ThresholdEngine(FRONTRUN_PERCENTAGE, NOTIFICATION_DELAY)
+    global windows
+    windows = {}
+    global confirmer
+    confirmer = new_confirmer()
+
+    trades = asyncio.Queue()
+    trade_evaluator = asyncio.create_task(evaluate_trades(trades, queue))
+    breakout_checker = asyncio.create_task(check_breakouts(queue)) if confirmer is not None else None
+    decoder = get_decoder(STREAM_DECODER)
+    logger.info(f"Decoding stream frames with {decoder.__name__}")
+    streams = StreamMultiplexer(STREAM_URL, STREAM_TYPES, STREAMS_PER_CONNECTION // len(STREAM_TYPES), partial(handle_event, trades), decoder)
+    metrics.set('queue_depth', trades.qsize, queue='trades')
+    metrics.set('stream_connections', lambda: len(streams.connections))
+    metrics.set('watched_symbols', lambda: len(streams.assigned))
+    if confirmer is not None:
+        metrics.set('pending_breakouts', lambda: len(confirmer.pending))
+
+    try:
+        async for symbols in universe:
             try:
-                await bot.send_message(chat_id=CHAT_ID, text=message)
-                logger.info(f"{symbol} sent {alert_type} alert. Success")
-                break  # Exit loop if successful
-            except RetryAfter as e:
-                wait_time = e.retry_after
-                logger.warning(f"Rate limited. Waiting for {wait_time} seconds before retrying.")
-                await asyncio.sleep(wait_time)
-            except TelegramError as e:
-                logger.error(f"{symbol} sent {alert_type} alert. Fail")
-                await asyncio.sleep(MESSAGE_THROTTLE)  # Wait before retrying on other errors
-        queue.task_done()
-        await asyncio.sleep(MESSAGE_QUEUE_DELAY)  # Delay between processing messages
-
-# Update kline data in the file
-def update_kline_file(symbol, new_data):
-    if os.path.exists(KLINES_FILE):
-        with open(KLINES_FILE, 'r') as f:
-            klines_data = json.load(f)
-    else:
-        klines_data = {}
-
-    klines_data[symbol] = new_data
-    with open(KLINES_FILE, 'w') as f:
-        json.dump(klines_data, f)
-
-# Handle WebSocket messages
-async def handle_message(symbol, uri, queue):
-    async with websockets.connect(uri) as websocket:
-        while True:
-            msg = await websocket.recv()
-            event = json.loads(msg)
-            price = float(event['p'])
-            now = time.time()
-
-            if price + price * FRONTRUN_PERCENTAGE >= klines_data[symbol]['high']:
-                if now - notifications[symbol]['high'] > NOTIFICATION_DELAY:
-                    await queue.put((f"{symbol} High!", symbol, "high"))
-                    notifications[symbol]['high'] = now
-                    klines_data[symbol]['high'] = price  # Update with new high
-                    update_kline_file(symbol, klines_data[symbol])
-            elif price - price * FRONTRUN_PERCENTAGE <= klines_data[symbol]['low']:
-                if now - notifications[symbol]['low'] > NOTIFICATION_DELAY:
-                    await queue.put((f"{symbol} Low!", symbol, "low"))
-                    notifications[symbol]['low'] = now
-                    klines_data[symbol]['low'] = price  # Update with new low
-                    update_kline_file(symbol, klines_data[symbol])
-
-# Manage WebSocket connections in batches
-async def manage_connections(symbols, queue):
-    batches = [symbols[i:i + MAX_CONCURRENT_CONNECTIONS] for i in range(0, len(symbols), MAX_CONCURRENT_CONNECTIONS)]
-    
-    for batch in batches:
-        tasks = []
-        for symbol in batch:
-            uri = f"wss://fstream.binance.com/ws/{symbol.lower()}@trade"
-            tasks.append(handle_message(symbol, uri, queue))
-        
-        await asyncio.gather(*tasks)
-        logger.info(f"Sleeping for 1 second before starting the next batch...")
-        await asyncio.sleep(1)  # Give some time before starting the next batch
+                await apply_universe(streams, symbols)
+            except Exception as e:
+                logger.error(f"Failed to apply symbols: {e}")
+            logger.info(f"Stream stats: {streams.stats()}")
+    finally:
+        await streams.close()
+        trade_evaluator.cancel()
+        if breakout_checker is not None:
+            breakout_checker.cancel()
+        level_writer.cancel()
+        await klines_data.flush()
+
+# Symbol lists sent by the supervisor to a shard, until it sends None
+async def assigned_symbols(commands):
+    while True:
+        try:
+            symbols = commands.get_nowait()
+        except Empty:
+            await asyncio.sleep(SHARD_POLL_INTERVAL)
+            continue
+        if symbols is None:
+            return
+        yield symbols
+
+# Entry point of a shard process, watching the symbols the supervisor assigns it
+def run_shard(shard, commands, output):
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(logging.Formatter(f'%(asctime)s - shard {shard} - %(message)s', datefmt='%H:%M:%S'))
+    try:
+        asyncio.run(shard_main(shard, commands, output))
+    except KeyboardInterrupt:
+        pass
+
+async def shard_main(shard, commands, output):
+    global async_client
+    async_client = await create_client(BINANCE_API_KEY, BINANCE_API_SECRET, futures_url=BINANCE_FUTURES_URL)
+    global kline_budget
+    kline_budget = WeightBudget((WEIGHT_LIMIT - WEIGHT_RESERVE) // SHARDS)  # Shards share the key's weight limit
+    alerts = ShardOutput(shard, output)
+    stats_sender = asyncio.create_task(alerts.run())
+    try:
+        await watch(assigned_symbols(commands), alerts, KLINES_FILE.replace('.json', f'.{shard}.json'))
+    finally:
+        stats_sender.cancel()
+        await async_client.close_connection()
 
 # Main function
 async def main():
-    symbols = load_symbols()
-    global klines_data
-    klines_data = load_klines()
-    klines_data = update_klines(klines_data, symbols)
-
-    global notifications
-    notifications = {symbol: {'high': 0, 'low': 0} for symbol in symbols}
+    global bot
+    bot = Bot(token=TELEGRAM_TOKEN, base_url=TELEGRAM_API_URL)
+    global async_client
+    async_client = await create_client(BINANCE_API_KEY, BINANCE_API_SECRET, futures_url=BINANCE_FUTURES_URL)
+    global ranker
+    ranker = SymbolRanker(async_client, TOP_SYMBOLS, QUOTE_ASSET, EXCLUDED_SYMBOLS, EXCHANGE_INFO_TTL)
+    symbols = await load_symbols()
 
     queue = asyncio.Queue()
-    message_sender = asyncio.create_task(send_message(queue))
+    message_sender = asyncio.create_task(AlertDispatcher(bot, CHAT_ID).run(queue))
+    command_listener = asyncio.create_task(answer_commands())
+    metrics.set('queue_depth', queue.qsize, queue='alerts')
+    if METRICS_PORT:
+        await metrics.serve(METRICS_PORT)
 
     try:
-        while True:
-            symbols = update_symbols()  # Update symbols every 6 hours
-            klines_data = update_klines(klines_data, symbols)
-            await manage_connections(symbols, queue)
-            logger.info(f"Sleeping for {UPDATE_INTERVAL} seconds before updating symbols again...")
-            await asyncio.sleep(UPDATE_INTERVAL)
+        if SHARDS > 1:
+            # Streams and checks run in shard processes, this one ranks symbols and sends the alerts
+            shards = ShardPool(SHARDS, run_shard, queue)
+            shards.start()
+            try:
+                async for symbols in refreshed_symbols(symbols):
+                    shards.set_symbols(symbols)
+            finally:
+                await shards.close()
+        else:
+            await watch(refreshed_symbols(symbols), queue)
     finally:
+        command_listener.cancel()
+        await async_client.close_connection()
         await queue.join()
         message_sender.cancel()
         await message_sender
@@ -0,0 +1,70 @@
+import os
+import json
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 5  # Seconds between flushes of changed levels to disk
+
+# In-memory store for the rolling level windows, persisted to disk in batches and read back on a restart
+class LevelStore:
+    def __init__(self, path, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.data = self.load()
+        self.dirty = set()
+        self.lock = asyncio.Lock()
+
+    def load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        return {}
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.dirty.add(key)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    # Forget every symbol that is not in `keep`
+    def prune(self, keep):
+        for key in [key for key in self.data if key not in keep]:
+            del self.data[key]
+            self.dirty.add(key)
+
+    # Write to a temp file and rename it over the old one so readers never see a partial file
+    def write(self, snapshot):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    # Persist all pending changes off the event loop
+    async def flush(self):
+        if not self.dirty:
+            return
+        async with self.lock:
+            dirty, self.dirty = self.dirty, set()
+            snapshot = {key: dict(value) if isinstance(value, dict) else value for key, value in self.data.items()}
+            try:
+                await asyncio.to_thread(self.write, snapshot)
+            except OSError as e:
+                self.dirty |= dirty  # Keep them pending for the next flush
+                logger.error(f"Failed to save levels: {e}")
+
+    # Flush changed levels periodically
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
@@ -0,0 +1,37 @@
+import time
+import heapq
+
+# Ranks futures symbols by 24h quote volume, caching the tradable symbol set
+class SymbolRanker:
+    def __init__(self, client, top_n, quote_asset, excluded, info_ttl):
+        self.client = client
+        self.top_n = top_n
+        self.quote_asset = quote_asset
+        self.excluded = set(excluded)
+        self.info_ttl = info_ttl
+        self.tradable = set()
+        self.loaded_at = None
+
+    # Perpetual contracts in the quote asset that are currently trading
+    async def tradable_symbols(self):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > self.info_ttl:
+            info = await self.client.futures_exchange_info()
+            self.tradable = {
+                s['symbol'] for s in info['symbols']
+                if s['quoteAsset'] == self.quote_asset
+                and s['status'] == 'TRADING'
+                and s.get('contractType') == 'PERPETUAL'
+                and s['symbol'] not in self.excluded
+            }
+            self.loaded_at = time.monotonic()
+        return self.tradable
+
+    async def top_symbols(self):
+        tradable = await self.tradable_symbols()
+        tickers = await self.client.futures_ticker()
+        top = heapq.nlargest(
+            self.top_n,
+            (ticker for ticker in tickers if ticker['symbol'] in tradable),
+            key=lambda x: float(x['quoteVolume'])
+        )
+        return [ticker['symbol'] for ticker in top]
@@ -0,0 +1,63 @@
+import time
+from collections import deque
+
+INTERVAL_MS = {
+    '1h': 3600 * 1000,
+    '1d': 24 * 3600 * 1000,
+}
+
+# Exact rolling high/low over the last `size` kline buckets, kept with monotonic deques
+class RollingWindow:
+    def __init__(self, size, interval='1d'):
+        self.size = size
+        self.interval = interval
+        self.bucket_ms = INTERVAL_MS[interval]
+        self.highs = deque()  # (open_time, high) with decreasing highs
+        self.lows = deque()  # (open_time, low) with increasing lows
+        self.current = None
+
+    # Feed the latest high/low of the bucket opened at `open_time`
+    def update(self, open_time, high, low):
+        if self.current is not None and open_time < self.current:
+            return  # Late event for a bucket already rolled past
+        self.current = open_time
+        expiry = open_time - (self.size - 1) * self.bucket_ms
+
+        while self.highs and self.highs[-1][1] <= high:
+            self.highs.pop()
+        self.highs.append((open_time, high))
+        while self.highs[0][0] < expiry:
+            self.highs.popleft()
+
+        while self.lows and self.lows[-1][1] >= low:
+            self.lows.pop()
+        self.lows.append((open_time, low))
+        while self.lows[0][0] < expiry:
+            self.lows.popleft()
+
+    # JSON friendly copy of the window, restored with `restore`
+    def state(self):
+        return {'high': self.high, 'low': self.low, 'interval': self.interval, 'size': self.size,
+                'current': self.current, 'highs': list(self.highs), 'lows': list(self.lows)}
+
+    # Window saved by `state`, or None if it has a different shape or a bucket was missed since it was saved
+    @classmethod
+    def restore(cls, state, size, interval='1d', now=None):
+        window = cls(size, interval)
+        if not isinstance(state, dict) or state.get('interval') != interval or state.get('size') != size:
+            return None
+        now_ms = int((time.time() if now is None else now) * 1000)
+        if state.get('current') != now_ms - now_ms % window.bucket_ms:
+            return None  # Only the current bucket is refreshed by the stream, older ones would be stale
+        window.current = state['current']
+        window.highs.extend((open_time, high) for open_time, high in state['highs'])
+        window.lows.extend((open_time, low) for open_time, low in state['lows'])
+        return window
+
+    @property
+    def high(self):
+        return self.highs[0][1]
+
+    @property
+    def low(self):
+        return self.lows[0][1]
@@ -0,0 +1,102 @@
+import zlib
+import asyncio
+import logging
+import multiprocessing
+from shared.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STATS_INTERVAL = 10  # Seconds between metrics snapshots sent by each shard
+CHECK_INTERVAL = 5  # Seconds between checks that every shard process is still alive
+STOP_TIMEOUT = 10  # Seconds a shard gets to flush its levels and exit before it is killed
+
+# Stable shard of a symbol, so a universe refresh only moves symbols that were added or removed
+def shard_of(symbol, count):
+    return zlib.crc32(symbol.encode()) % count
+
+# Runs `target(shard, commands, output)` in one process per shard, sends each its symbols
+# and feeds the alerts they put on the shared output queue into the local alert queue
+class ShardPool:
+    def __init__(self, count, target, queue):
+        self.count = count
+        self.target = target
+        self.queue = queue
+        self.context = multiprocessing.get_context('spawn')  # A fork would copy the running event loop
+        self.output = self.context.Queue()
+        self.commands = [self.context.Queue() for _ in range(count)]
+        self.processes = [None] * count
+        self.assigned = [None] * count  # Last symbol list sent to each shard, resent after a restart
+        self.tasks = []
+
+    def spawn(self, shard):
+        process = self.context.Process(target=self.target, args=(shard, self.commands[shard], self.output),
+                                       name=f'shard-{shard}', daemon=True)
+        process.start()
+        self.processes[shard] = process
+
+    def start(self):
+        for shard in range(self.count):
+            self.spawn(shard)
+        self.tasks = [asyncio.create_task(self.forward()), asyncio.create_task(self.watch())]
+        metrics.set('shards_alive', lambda: sum(p.is_alive() for p in self.processes))
+
+    # Split the universe and send every shard its part
+    def set_symbols(self, symbols):
+        parts = [[] for _ in range(self.count)]
+        for symbol in symbols:
+            parts[shard_of(symbol, self.count)].append(symbol)
+        for shard, part in enumerate(parts):
+            self.assigned[shard] = part
+            self.commands[shard].put(part)
+        logger.info(f"Split {len(symbols)} symbols over {self.count} shards: {[len(part) for part in parts]}")
+
+    # Move alerts and metrics snapshots from the shards onto the event loop
+    async def forward(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await loop.run_in_executor(None, self.output.get)
+            if message is None:
+                return
+            kind, shard, payload = message
+            if kind == 'alert':
+                self.queue.put_nowait(payload)
+            elif kind == 'stats':
+                metrics.merge(shard, payload)
+
+    # Restart a shard that died and hand it its symbols again
+    async def watch(self):
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL)
+            for shard, process in enumerate(self.processes):
+                if not process.is_alive():
+                    logger.error(f"Shard {shard} exited with code {process.exitcode}, restarting")
+                    metrics.inc('shard_restarts_total', shard=shard)
+                    self.spawn(shard)
+                    if self.assigned[shard] is not None:
+                        self.commands[shard].put(self.assigned[shard])
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        for commands in self.commands:
+            commands.put(None)
+        for process in self.processes:
+            await asyncio.to_thread(process.join, STOP_TIMEOUT)
+            if process.is_alive():
+                process.kill()
+        self.output.put(None)  # Releases the thread blocked in forward
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+# Alert queue stand-in used inside a shard, passing alerts and metrics to the supervisor
+class ShardOutput:
+    def __init__(self, shard, output):
+        self.shard = shard
+        self.output = output
+
+    async def put(self, alert):
+        self.output.put(('alert', self.shard, alert))
+
+    async def run(self, interval=STATS_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            self.output.put(('stats', self.shard, metrics.snapshot()))
\ No newline at end of file
@@ -0,0 +1,182 @@
+import json
+import time
+import random
+import asyncio
+import logging
+import websockets
+from websockets.exceptions import ConnectionClosed
+from shared.metrics import metrics
+from decoding import ERROR, get_decoder
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY = 1  # Seconds before the first reconnect attempt, doubled on each failure
+MAX_RECONNECT_DELAY = 60
+STALL_TIMEOUT = 30  # Seconds without any message before a connection is treated as dead
+MAX_CONNECTION_AGE = 23 * 3600  # Reconnect on our own terms before Binance's 24h disconnect
+
+# One combined stream connection whose symbols can be changed while it is live,
+# reconnected with backoff whenever it drops or stalls
+class StreamConnection:
+    def __init__(self, url, stream_types, handler, decoder=None):
+        self.url = url
+        self.stream_types = stream_types
+        self.handler = handler
+        self.decoder = decoder or get_decoder()
+        self.symbols = set()
+        self.websocket = None
+        self.request_id = 0
+        self.last_message = None
+        self.gap_pending = False
+        self.reconnects = 0
+        self.last_gap = 0.0
+        self.total_gap = 0.0
+
+    def streams(self, symbols):
+        return [f"{symbol.lower()}@{stream}" for symbol in symbols for stream in self.stream_types]
+
+    async def send(self, method, symbols):
+        if self.websocket is None or not symbols:
+            return  # Sent on connect instead
+        self.request_id += 1
+        try:
+            await self.websocket.send(json.dumps({'method': method, 'params': self.streams(symbols), 'id': self.request_id}))
+        except ConnectionClosed:
+            pass  # The socket is going down, connect resubscribes self.symbols on the next one
+
+    async def subscribe(self, symbols):
+        self.symbols.update(symbols)
+        await self.send('SUBSCRIBE', symbols)
+
+    async def unsubscribe(self, symbols):
+        self.symbols.difference_update(symbols)
+        await self.send('UNSUBSCRIBE', symbols)
+
+    async def connect(self):
+        async with websockets.connect(self.url) as websocket:
+            self.websocket = websocket
+            watchdog = asyncio.create_task(self.watch(websocket, time.monotonic()))
+            try:
+                await self.send('SUBSCRIBE', sorted(self.symbols))
+                async for msg in websocket:
+                    now = time.monotonic()
+                    if self.gap_pending and self.last_message is not None:
+                        self.record_gap(now)
+                    self.last_message = now
+                    self.dispatch(msg)
+            finally:
+                watchdog.cancel()
+                self.websocket = None
+
+    # Decode one frame and pass its event to the handler
+    def dispatch(self, msg):
+        event = self.decoder(msg)
+        if event is None:
+            return
+        if event[0] == ERROR:
+            logger.error(f"Stream request {event[1]} failed: {event[2]}")
+        else:
+            self.handler(event)
+
+    # Close the socket if it goes quiet or gets close to the 24h limit
+    async def watch(self, websocket, connected_at):
+        while True:
+            await asyncio.sleep(STALL_TIMEOUT / 2)
+            now = time.monotonic()
+            quiet = now - max(self.last_message or 0, connected_at)
+            if quiet > STALL_TIMEOUT and self.symbols:
+                logger.warning(f"Stream stalled for {quiet:.0f}s, reconnecting")
+                await websocket.close()
+                return
+            if now - connected_at > MAX_CONNECTION_AGE:
+                logger.info("Stream reached its maximum age, reconnecting")
+                await websocket.close()
+                return
+
+    def record_gap(self, now):
+        self.gap_pending = False
+        self.last_gap = now - self.last_message
+        self.total_gap += self.last_gap
+        metrics.observe('stream_gap_seconds', self.last_gap, stream='market')
+        logger.info(f"Stream resumed after a {self.last_gap:.1f}s gap ({self.reconnects} reconnects)")
+
+    async def run(self):
+        delay = RECONNECT_DELAY
+        while True:
+            started = time.monotonic()
+            try:
+                await self.connect()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Stream connection lost: {e}")
+            if time.monotonic() - started > STALL_TIMEOUT:
+                delay = RECONNECT_DELAY  # It was healthy for a while, start the backoff over
+            self.reconnects += 1
+            metrics.inc('stream_reconnects_total', stream='market')
+            self.gap_pending = True
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+# Spreads symbols over as few connections as possible and moves them in and out live
+class StreamMultiplexer:
+    connection_class = StreamConnection
+
+    def __init__(self, url, stream_types, per_connection, handler, decoder=None):
+        self.url = url
+        self.stream_types = stream_types
+        self.per_connection = per_connection
+        self.handler = handler
+        self.decoder = decoder or get_decoder()
+        self.connections = []
+        self.tasks = []
+        self.assigned = {}  # Symbol -> connection carrying it
+
+    def open_connection(self):
+        connection = self.connection_class(self.url, self.stream_types, self.handler, self.decoder)
+        self.connections.append(connection)
+        self.tasks.append(asyncio.create_task(connection.run()))
+        return connection
+
+    # Subscribe new symbols and unsubscribe dropped ones, returns (added, removed)
+    async def set_symbols(self, symbols):
+        wanted = set(symbols)
+        removed = [symbol for symbol in self.assigned if symbol not in wanted]
+        added = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self.assigned]
+
+        by_connection = {}
+        for symbol in removed:
+            by_connection.setdefault(self.assigned.pop(symbol), []).append(symbol)
+        for connection, dropped in by_connection.items():
+            await connection.unsubscribe(dropped)
+
+        pending = list(added)
+        for connection in self.connections:
+            free = self.per_connection - len(connection.symbols)
+            if free > 0 and pending:
+                await self.assign(connection, pending[:free])
+                pending = pending[free:]
+        while pending:
+            await self.assign(self.open_connection(), pending[:self.per_connection])
+            pending = pending[self.per_connection:]
+        return added, removed
+
+    async def assign(self, connection, symbols):
+        for symbol in symbols:
+            self.assigned[symbol] = connection
+        await connection.subscribe(symbols)
+
+    # Reconnect counts and gap durations summed over all connections
+    def stats(self):
+        return {
+            'connections': len(self.connections),
+            'symbols': len(self.assigned),
+            'reconnects': sum(c.reconnects for c in self.connections),
+            'gap_seconds': sum(c.total_gap for c in self.connections),
+            'last_gap_seconds': max((c.last_gap for c in self.connections), default=0.0),
+        }
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
@@ -0,0 +1,90 @@
+import numpy as np
+
+# Holds levels and cooldowns for every symbol in flat arrays and checks trades in batches
+class ThresholdEngine:
+    def __init__(self, frontrun, cooldown, capacity=64):
+        self.frontrun = frontrun
+        self.cooldown = cooldown
+        self.ids = {}  # Symbol -> slot in the arrays
+        self.symbols = []  # Slot -> symbol
+        self.free = []
+        self.highs = np.full(capacity, np.inf)
+        self.lows = np.full(capacity, -np.inf)
+        self.last_high = np.zeros(capacity)
+        self.last_low = np.zeros(capacity)
+
+    def allocate(self, symbol):
+        if self.free:
+            slot = self.free.pop()
+        else:
+            slot = len(self.symbols)
+            self.symbols.append(None)
+            if slot >= len(self.highs):
+                self.grow()
+        self.symbols[slot] = symbol
+        self.ids[symbol] = slot
+        self.last_high[slot] = 0
+        self.last_low[slot] = 0
+        return slot
+
+    def grow(self):
+        size = len(self.highs)
+        self.highs = np.concatenate([self.highs, np.full(size, np.inf)])
+        self.lows = np.concatenate([self.lows, np.full(size, -np.inf)])
+        self.last_high = np.concatenate([self.last_high, np.zeros(size)])
+        self.last_low = np.concatenate([self.last_low, np.zeros(size)])
+
+    def set_levels(self, symbol, high, low):
+        slot = self.ids.get(symbol)
+        if slot is None:
+            slot = self.allocate(symbol)
+        self.highs[slot] = high
+        self.lows[slot] = low
+
+    def remove(self, symbol):
+        slot = self.ids.pop(symbol, None)
+        if slot is None:
+            return
+        self.symbols[slot] = None
+        self.highs[slot] = np.inf
+        self.lows[slot] = -np.inf
+        self.free.append(slot)
+
+    # Price a trade has to reach for a symbol's high or low alert
+    def threshold(self, symbol, alert_type):
+        slot = self.ids[symbol]
+        if alert_type == 'high':
+            return float(self.highs[slot] / (1 + self.frontrun))
+        return float(self.lows[slot] / (1 - self.frontrun))
+
+    # Start the cooldown of a symbol's high or low alert
+    def commit(self, symbol, alert_type, now):
+        slot = self.ids.get(symbol)
+        if slot is None:
+            return
+        if alert_type == 'high':
+            self.last_high[slot] = now
+        else:
+            self.last_low[slot] = now
+
+    # Check a batch of trades and return (symbol, 'high'/'low', price) for every alert.
+    # Levels only follow the rolling windows, the cooldown keeps a level from alerting again.
+    # With commit=False the alerts are only candidates and no cooldown starts.
+    def evaluate(self, slots, prices, now, commit=True):
+        slots = np.asarray(slots, dtype=np.intp)
+        prices = np.asarray(prices, dtype=np.float64)
+        high_hit = prices * (1 + self.frontrun) >= self.highs[slots]
+        low_hit = ~high_hit & (prices * (1 - self.frontrun) <= self.lows[slots])
+
+        alerts = []
+        for hit, last, alert_type in ((high_hit, self.last_high, 'high'), (low_hit, self.last_low, 'low')):
+            hit &= now - last[slots] > self.cooldown
+            if not hit.any():
+                continue
+            # Only the first trade of a symbol in the batch alerts, the rest fall in its cooldown
+            hit_slots, first = np.unique(slots[hit], return_index=True)
+            hit_prices = prices[hit][first]
+            if commit:
+                last[hit_slots] = now
+            alerts.extend((self.symbols[slot], alert_type, price) for slot, price in zip(hit_slots.tolist(), hit_prices.tolist()))
+        return alerts
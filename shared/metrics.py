@@ -0,0 +1,207 @@
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+import aiohttp
+from aiohttp import web
+
+# In-process metrics for every bot: counters, gauges and latency summaries,
+# served as Prometheus text on a local port and summarised for the /stats command
+METRICS_HOST = '127.0.0.1'  # Only reachable from the machine the bot runs on
+SAMPLES = 2048  # Recent observations kept per series to compute quantiles from
+QUANTILES = (0.5, 0.9, 0.99)
+WEIGHT_HEADER = 'X-MBX-USED-WEIGHT-1M'  # Request weight used in the current minute, sent with every Binance response
+MAX_REPORT_LENGTH = 4096  # Telegram's message length limit
+
+# Count, sum and a window of recent values for one latency series
+class Summary:
+    __slots__ = ('count', 'total', 'samples')
+
+    def __init__(self, samples=SAMPLES):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=samples)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.samples.append(value)
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+def format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+class Metrics:
+    def __init__(self, samples=SAMPLES):
+        self.samples = samples  # Window of each new summary, raised by the benchmark to keep every sample
+        self.counters = {}  # (name, labels) -> value
+        self.gauges = {}  # (name, labels) -> value, or a function read when rendered
+        self.summaries = {}  # (name, labels) -> Summary
+        self.remote = {}  # Shard -> last snapshot received from that worker process
+        self.weight_minute = None
+        self.weight_used = 0
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    # Set a gauge to a value, or to a zero-argument function such as a queue's qsize
+    def set(self, name, value, **labels):
+        self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        summary = self.summaries.get(key)
+        if summary is None:
+            summary = self.summaries[key] = Summary(self.samples)
+        summary.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def gauge_values(self):
+        for key, value in self.gauges.items():
+            try:
+                yield key, float(value() if callable(value) else value)
+            except Exception as e:
+                logging.error(f"Failed to read gauge {key[0]}: {e}")
+
+    # Picklable copy of every series, sent by worker processes to the one serving the metrics
+    def snapshot(self):
+        return {
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauge_values()),
+            'summaries': {key: (s.count, s.total, list(s.samples)) for key, s in self.summaries.items()},
+        }
+
+    # Show a worker's series next to our own, labelled with its shard
+    def merge(self, shard, snapshot):
+        self.remote[shard] = snapshot
+
+    # Own series plus the ones merged from workers, as (counters, gauges, summaries)
+    def collect(self):
+        counters = dict(self.counters)
+        gauges = dict(self.gauge_values())
+        summaries = dict(self.summaries)
+        for shard, snapshot in sorted(self.remote.items()):
+            extra = (('shard', shard),)
+            for (name, labels), value in snapshot['counters'].items():
+                counters[(name, labels + extra)] = value
+            for (name, labels), value in snapshot['gauges'].items():
+                gauges[(name, labels + extra)] = value
+            for (name, labels), (count, total, samples) in snapshot['summaries'].items():
+                summary = Summary(max(len(samples), 1))
+                summary.count, summary.total = count, total
+                summary.samples.extend(samples)
+                summaries[(name, labels + extra)] = summary
+        return counters, gauges, summaries
+
+    # Prometheus text exposition format
+    def render(self):
+        lines = []
+        typed = set()
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+        counters, gauges, summaries = self.collect()
+        for (name, labels), value in sorted(counters.items()):
+            header(name, 'counter')
+            lines.append(f'{name}{format_labels(labels)} {value}')
+        for (name, labels), value in sorted(gauges.items()):
+            header(name, 'gauge')
+            lines.append(f'{name}{format_labels(labels)} {value}')
+        for (name, labels), summary in sorted(summaries.items()):
+            header(name, 'summary')
+            for q, value in summary.quantiles().items():
+                lines.append(f'{name}{format_labels(labels, [("quantile", q)])} {value:.6f}')
+            lines.append(f'{name}_sum{format_labels(labels)} {summary.total:.6f}')
+            lines.append(f'{name}_count{format_labels(labels)} {summary.count}')
+        return '\n'.join(lines) + '\n'
+
+    # Short human readable version for Telegram, latencies in milliseconds
+    def report(self, title, limit=MAX_REPORT_LENGTH):
+        lines = [title]
+        counters, gauges, summaries = self.collect()
+        for (name, labels), summary in sorted(summaries.items()):
+            q = summary.quantiles()
+            lines.append(f"{name}{format_labels(labels)}: n={summary.count} "
+                         f"p50={q[0.5] * 1000:.1f}ms p99={q[0.99] * 1000:.1f}ms")
+        for (name, labels), value in sorted(counters.items()):
+            lines.append(f"{name}{format_labels(labels)}: {value}")
+        for (name, labels), value in sorted(gauges.items()):
+            lines.append(f"{name}{format_labels(labels)}: {value:g}")
+        text = ''
+        for line in lines:
+            if len(text) + len(line) + 2 > limit:
+                return text + '…'
+            text += line + '\n'
+        return text.strip()
+
+    # Per endpoint cost taken from the change in the used weight header,
+    # approximate when requests overlap
+    def record_weight(self, endpoint, headers):
+        used = headers.get(WEIGHT_HEADER)
+        if used is None:
+            return
+        used = int(used)
+        minute = int(time.time() // 60)
+        previous = self.weight_used if minute == self.weight_minute else 0
+        self.weight_minute = minute
+        self.weight_used = max(used, previous)
+        self.set('binance_used_weight_1m', self.weight_used)
+        self.inc('binance_rest_weight_total', max(used - previous, 0), endpoint=endpoint)
+
+    def record_request(self, method, url, status, seconds, headers):
+        endpoint = urlsplit(str(url)).path
+        self.observe('binance_rest_seconds', seconds, method=method, endpoint=endpoint)
+        self.inc('binance_rest_requests_total', method=method, endpoint=endpoint, status=status)
+        self.record_weight(endpoint, headers)
+
+    # aiohttp tracing hooks that time every request of a client session
+    def trace_config(self):
+        async def on_request_start(session, context, params):
+            context.started = time.perf_counter()
+
+        async def on_request_end(session, context, params):
+            self.record_request(params.method, params.url, params.response.status,
+                                time.perf_counter() - context.started, params.response.headers)
+
+        async def on_request_exception(session, context, params):
+            self.inc('binance_rest_errors_total', method=params.method, endpoint=params.url.path)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        return trace_config
+
+    async def handle(self, request):
+        return web.Response(body=self.render(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    # Serve /metrics on a local port for as long as the event loop runs
+    async def serve(self, port, host=METRICS_HOST):
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logging.info(f"Serving metrics on http://{host}:{port}/metrics")
+        return runner
+
+# One registry per process, shared by every module of a bot
+metrics = Metrics()
\ No newline at end of file
@@ -0,0 +1,547 @@
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+from aiohttp import web, WSMsgType
+
+# Local stand-in for the Binance futures endpoints and streams the bots use, plus a fake Telegram Bot API.
+# Point the bots at it with BINANCE_FUTURES_URL / BI_FUTURES_URL = http://HOST:PORT/fapi,
+# the stream URLs = ws://HOST:PORT and TELEGRAM_API_URL = http://HOST:PORT/bot
+
+DAY_MS = 24 * 3600 * 1000
+HOUR_MS = 3600 * 1000
+HISTORY_DAYS = 30
+START_BALANCE = 10000.0
+MAINT_MARGIN_RATE = 0.004
+CONDITIONAL_TYPES = ('STOP_MARKET', 'TAKE_PROFIT_MARKET')  # Only accepted on the algo order endpoint
+BOOK_SPREAD = 0.0002  # Bid/ask spread around the last trade in bookTicker events
+
+logger = logging.getLogger('simulator')
+
+def now_ms():
+    return int(time.time() * 1000)
+
+# Prices for every symbol, from a replayed path file or a seeded random walk
+class Market:
+    def __init__(self, symbols, paths=None, seed=0, volatility=0.0005):
+        self.random = random.Random(seed)
+        self.symbols = symbols
+        self.paths = paths or {}
+        self.volatility = volatility
+        self.step = 0
+        self.trade_id = 0
+        self.prices = {}
+        self.volumes = {}
+        self.candles = {}  # (symbol, interval ms) -> {open time: [open, high, low, close, volume]}
+        for i, symbol in enumerate(symbols):
+            path = self.paths.get(symbol)
+            self.prices[symbol] = float(path[0]) if path else round(self.random.uniform(0.1, 1000), 4)
+            self.volumes[symbol] = 1e9 / (i + 1)
+            self.seed_history(symbol)
+
+    def seed_history(self, symbol):
+        price = self.prices[symbol]
+        today = now_ms() // DAY_MS * DAY_MS
+        days = {}
+        for day in range(HISTORY_DAYS, 0, -1):
+            close = price * (1 + self.random.gauss(0, self.volatility * 30))
+            high = max(price, close) * (1 + abs(self.random.gauss(0, self.volatility * 10)))
+            low = min(price, close) * (1 - abs(self.random.gauss(0, self.volatility * 10)))
+            days[today - day * DAY_MS] = [price, high, low, close, 0.0]
+        self.candles[(symbol, DAY_MS)] = days
+        self.candles[(symbol, HOUR_MS)] = {}
+
+    def next_price(self, symbol):
+        path = self.paths.get(symbol)
+        if path:
+            return float(path[self.step % len(path)])
+        return self.prices[symbol] * (1 + self.random.gauss(0, self.volatility))
+
+    def record(self, symbol, price, quantity, timestamp):
+        for interval in (DAY_MS, HOUR_MS):
+            open_time = timestamp // interval * interval
+            candles = self.candles[(symbol, interval)]
+            candle = candles.get(open_time)
+            if candle is None:
+                candles[open_time] = [price, price, price, price, quantity]
+            else:
+                candle[1] = max(candle[1], price)
+                candle[2] = min(candle[2], price)
+                candle[3] = price
+                candle[4] += quantity
+
+    # Advance every symbol one step and return the trades it produced
+    def tick(self, trades_per_symbol):
+        trades = []
+        timestamp = now_ms()
+        for symbol in self.symbols:
+            for _ in range(trades_per_symbol):
+                price = self.next_price(symbol)
+                quantity = round(self.random.uniform(0.001, 10), 3)
+                self.prices[symbol] = price
+                self.trade_id += 1
+                self.record(symbol, price, quantity, timestamp)
+                trades.append((symbol, price, quantity, self.trade_id, timestamp))
+        self.step += 1
+        return trades
+
+    def klines(self, symbol, interval, limit):
+        candles = self.candles[(symbol, interval)]
+        rows = []
+        for open_time in sorted(candles)[-limit:]:
+            o, h, l, c, v = candles[open_time]
+            rows.append([open_time, str(o), str(h), str(l), str(c), str(v), open_time + interval - 1])
+        return rows
+
+# An order Binance would reject, answered with its error code
+class OrderRejected(ValueError):
+    def __init__(self, code, msg):
+        super().__init__(msg)
+        self.code = code
+
+# Positions, balance and conditional orders of one simulated account
+class Account:
+    def __init__(self, market):
+        self.market = market
+        self.wallet = START_BALANCE
+        self.positions = {}  # Symbol -> [amount, entry price]
+        self.algo_orders = {}  # Algo id -> open conditional order
+        self.order_id = 0
+        self.algo_id = 0
+        self.listeners = set()  # Queues of connected user data streams
+
+    def emit(self, event):
+        for queue in self.listeners:
+            queue.put_nowait(event)
+
+    def position_event(self, symbol):
+        amount, entry = self.positions.get(symbol, [0.0, 0.0])
+        pnl = (self.market.prices[symbol] - entry) * amount
+        return {'s': symbol, 'pa': str(amount), 'ep': str(entry), 'up': str(pnl), 'ps': 'BOTH'}
+
+    def fill(self, symbol, side, quantity, price):
+        delta = quantity if side == 'BUY' else -quantity
+        amount, entry = self.positions.get(symbol, [0.0, 0.0])
+        if amount == 0 or (amount > 0) == (delta > 0):
+            entry = (amount * entry + delta * price) / (amount + delta)
+        else:
+            closed = min(abs(delta), abs(amount))
+            self.wallet += closed * (price - entry) * (1 if amount > 0 else -1)
+            if abs(delta) > abs(amount):
+                entry = price
+        amount = round(amount + delta, 8)
+        if amount == 0:
+            self.positions.pop(symbol, None)
+        else:
+            self.positions[symbol] = [amount, entry]
+        self.emit({'e': 'ACCOUNT_UPDATE', 'E': now_ms(), 'a': {
+            'm': 'ORDER',
+            'B': [{'a': 'USDT', 'wb': str(self.wallet), 'cw': str(self.wallet)}],
+            'P': [self.position_event(symbol)],
+        }})
+
+    def order_event(self, order, status, price=0.0):
+        self.emit({'e': 'ORDER_TRADE_UPDATE', 'E': now_ms(), 'o': {
+            's': order['symbol'], 'S': order['side'], 'o': order['type'], 'i': order['orderId'],
+            'q': str(order['origQty']), 'X': status, 'ap': str(price),
+        }})
+
+    def algo_event(self, order, status):
+        self.emit({'e': 'ALGO_UPDATE', 'E': now_ms(), 'o': {
+            'caid': order['clientAlgoId'], 'aid': order['algoId'], 'at': order['algoType'], 'o': order['orderType'],
+            's': order['symbol'], 'S': order['side'], 'q': str(order['quantity']), 'tp': str(order['triggerPrice']), 'X': status,
+        }})
+
+    def check_symbol(self, params):
+        symbol = params.get('symbol')
+        if symbol not in self.market.prices:
+            raise OrderRejected(-1121, 'Invalid symbol.')
+        return symbol
+
+    # Execute one order given as request parameters, returning the REST response
+    def place(self, params):
+        symbol = self.check_symbol(params)
+        side = params['side']
+        order_type = params['type']
+        if order_type in CONDITIONAL_TYPES:
+            raise OrderRejected(-4120, 'Order type not supported for this endpoint. Please use the Algo Order API endpoints instead.')
+        if order_type != 'MARKET':
+            raise OrderRejected(-1116, 'Only MARKET and conditional orders are simulated.')
+        amount = self.positions.get(symbol, [0.0, 0.0])[0]
+        quantity = float(params['quantity'])
+        self.order_id += 1
+        order = {
+            'orderId': self.order_id, 'symbol': symbol, 'side': side, 'type': order_type, 'origQty': quantity,
+            'reduceOnly': params.get('reduceOnly') == 'true', 'status': 'NEW', 'updateTime': now_ms(),
+        }
+        if order['reduceOnly']:
+            if amount == 0 or (amount > 0) == (side == 'BUY'):
+                raise OrderRejected(-2022, 'ReduceOnly Order is rejected.')
+            quantity = min(quantity, abs(amount))
+        price = self.market.prices[symbol]
+        self.fill(symbol, side, quantity, price)
+        order.update({'status': 'FILLED', 'executedQty': quantity, 'avgPrice': price})
+        self.order_event(order, 'FILLED', price)
+        return self.response(order)
+
+    # Rest one conditional order sent to the algo endpoint, answered with an algoId
+    def place_algo(self, params):
+        symbol = self.check_symbol(params)
+        if params.get('algoType') != 'CONDITIONAL' or params['type'] not in CONDITIONAL_TYPES:
+            raise OrderRejected(-1116, 'Only CONDITIONAL STOP_MARKET and TAKE_PROFIT_MARKET algo orders are simulated.')
+        close_position = params.get('closePosition') == 'true'
+        self.algo_id += 1
+        order = {
+            'algoId': self.algo_id, 'clientAlgoId': params.get('clientAlgoId', f"sim{self.algo_id}"), 'algoType': 'CONDITIONAL',
+            'orderType': params['type'], 'symbol': symbol, 'side': params['side'], 'positionSide': 'BOTH',
+            'quantity': 0.0 if close_position else float(params['quantity']), 'triggerPrice': float(params['triggerPrice']),
+            'algoStatus': 'NEW', 'reduceOnly': params.get('reduceOnly') == 'true', 'closePosition': close_position,
+            'createTime': now_ms(), 'updateTime': now_ms(),
+        }
+        self.algo_orders[order['algoId']] = order
+        self.algo_event(order, 'NEW')
+        return self.response(order)
+
+    def response(self, order):
+        return {key: str(value) if isinstance(value, float) else value for key, value in order.items()}
+
+    # Only conditional orders rest in the simulator, so there are no regular open orders to cancel
+    def cancel_all(self, symbol):
+        pass
+
+    def cancel_all_algo(self, symbol):
+        for algo_id in [i for i, o in self.algo_orders.items() if o['symbol'] == symbol]:
+            self.algo_event(self.algo_orders.pop(algo_id), 'CANCELED')
+
+    # Trigger resting stop and take profit orders at the latest prices
+    def check_orders(self):
+        for algo_id, order in list(self.algo_orders.items()):
+            price = self.market.prices[order['symbol']]
+            trigger = order['triggerPrice']
+            if order['orderType'] == 'STOP_MARKET':
+                triggered = price <= trigger if order['side'] == 'SELL' else price >= trigger
+            else:
+                triggered = price >= trigger if order['side'] == 'SELL' else price <= trigger
+            if not triggered:
+                continue
+            del self.algo_orders[algo_id]
+            amount = self.positions.get(order['symbol'], [0.0, 0.0])[0]
+            quantity = abs(amount) if order['closePosition'] else min(order['quantity'], abs(amount))
+            if quantity == 0:
+                self.algo_event(order, 'EXPIRED')
+                continue
+            self.algo_event(order, 'TRIGGERED')
+            self.order_id += 1
+            market_order = {'orderId': self.order_id, 'symbol': order['symbol'], 'side': order['side'], 'type': 'MARKET', 'origQty': quantity}
+            self.fill(order['symbol'], order['side'], quantity, price)
+            self.order_event(market_order, 'FILLED', price)
+            self.algo_event(order, 'FINISHED')
+
+    def snapshot(self):
+        positions = []
+        unrealized = 0.0
+        maint = 0.0
+        for symbol in self.market.symbols:
+            amount, entry = self.positions.get(symbol, [0.0, 0.0])
+            price = self.market.prices[symbol]
+            pnl = (price - entry) * amount
+            margin = abs(amount * price) * MAINT_MARGIN_RATE
+            unrealized += pnl
+            maint += margin
+            positions.append({
+                'symbol': symbol, 'positionAmt': str(amount), 'entryPrice': str(entry), 'unrealizedProfit': str(pnl),
+                'notional': str(amount * price), 'maintMargin': str(margin), 'positionSide': 'BOTH',
+            })
+        return {
+            'totalWalletBalance': str(self.wallet),
+            'totalMarginBalance': str(self.wallet + unrealized),
+            'totalMaintMargin': str(maint),
+            'totalCrossUnPnl': str(unrealized),
+            'assets': [{'asset': 'USDT', 'walletBalance': str(self.wallet)}],
+            'positions': positions,
+        }
+
+# One websocket client and the streams it is subscribed to
+class Subscriber:
+    def __init__(self, ws, streams, combined):
+        self.ws = ws
+        self.streams = set(streams)
+        self.combined = combined
+
+    async def send(self, stream, data):
+        payload = {'stream': stream, 'data': data} if self.combined else data
+        await self.ws.send_str(json.dumps(payload))
+
+class Simulator:
+    def __init__(self, market, latency=0.0, stream_latency=0.0, tick_interval=0.1, trades_per_tick=1):
+        self.market = market
+        self.account = Account(market)
+        self.latency = latency
+        self.stream_latency = stream_latency
+        self.tick_interval = tick_interval
+        self.trades_per_tick = trades_per_tick
+        self.subscribers = set()
+        self.listen_keys = set()
+        self.messages = []  # Messages received by the fake Telegram Bot API
+        self.updates = []  # Messages queued for bots polling getUpdates
+
+    def app(self):
+        app = web.Application(middlewares=[self.delay])
+        app.add_routes([
+            web.get('/fapi/v1/ping', self.ping),
+            web.get('/fapi/v1/exchangeInfo', self.exchange_info),
+            web.get('/fapi/v1/klines', self.klines),
+            web.get('/fapi/v1/premiumIndex', self.mark_price),
+            web.get('/fapi/v1/ticker/24hr', self.ticker),
+            web.get('/fapi/v2/account', self.account_info),
+            web.get('/fapi/v3/account', self.account_info),
+            web.post('/fapi/v1/order', self.create_order),
+            web.post('/fapi/v1/algoOrder', self.create_algo_order),
+            web.post('/fapi/v1/batchOrders', self.batch_orders),
+            web.delete('/fapi/v1/allOpenOrders', self.cancel_all),
+            web.delete('/fapi/v1/algoOpenOrders', self.cancel_all_algo),
+            web.post('/fapi/v1/listenKey', self.new_listen_key),
+            web.put('/fapi/v1/listenKey', self.keep_listen_key),
+            web.get('/stream', self.stream),
+            web.get('/ws/{name}', self.stream),
+            web.post('/bot{token}/{method}', self.telegram),
+            web.get('/telegram/messages', self.telegram_messages),
+            web.post('/telegram/updates', self.telegram_update),
+        ])
+        app.on_startup.append(self.start_ticker)
+        return app
+
+    @web.middleware
+    async def delay(self, request, handler):
+        if self.latency and request.path.startswith('/fapi'):
+            await asyncio.sleep(self.latency)
+        try:
+            return await handler(request)
+        except OrderRejected as e:
+            return web.json_response({'code': e.code, 'msg': str(e)}, status=400)
+        except (ValueError, KeyError) as e:
+            return web.json_response({'code': -1102, 'msg': str(e)}, status=400)
+
+    async def params(self, request):
+        params = dict(request.query)
+        if request.can_read_body:
+            params.update(await request.post())
+        return params
+
+    async def ping(self, request):
+        return web.json_response({})
+
+    async def exchange_info(self, request):
+        symbols = [{
+            'symbol': symbol, 'status': 'TRADING', 'contractType': 'PERPETUAL',
+            'baseAsset': symbol[:-4], 'quoteAsset': symbol[-4:], 'quantityPrecision': 3, 'pricePrecision': 4,
+            'filters': [
+                {'filterType': 'PRICE_FILTER', 'tickSize': '0.0001'},
+                {'filterType': 'LOT_SIZE', 'stepSize': '0.001'},
+                {'filterType': 'MIN_NOTIONAL', 'notional': '5'},
+            ],
+        } for symbol in self.market.symbols]
+        return web.json_response({'symbols': symbols})
+
+    async def klines(self, request):
+        params = await self.params(request)
+        interval = {'1d': DAY_MS, '1h': HOUR_MS}[params['interval']]
+        return web.json_response(self.market.klines(params['symbol'], interval, int(params.get('limit', 500))))
+
+    def mark(self, symbol):
+        price = self.market.prices[symbol]
+        return {'symbol': symbol, 'markPrice': str(price), 'indexPrice': str(price), 'time': now_ms()}
+
+    async def mark_price(self, request):
+        params = await self.params(request)
+        if 'symbol' in params:
+            return web.json_response(self.mark(params['symbol']))
+        return web.json_response([self.mark(symbol) for symbol in self.market.symbols])
+
+    async def ticker(self, request):
+        return web.json_response([{
+            'symbol': symbol, 'lastPrice': str(self.market.prices[symbol]), 'quoteVolume': str(self.market.volumes[symbol]),
+        } for symbol in self.market.symbols])
+
+    async def account_info(self, request):
+        return web.json_response(self.account.snapshot())
+
+    async def create_order(self, request):
+        return web.json_response(self.account.place(await self.params(request)))
+
+    async def create_algo_order(self, request):
+        return web.json_response(self.account.place_algo(await self.params(request)))
+
+    async def batch_orders(self, request):
+        params = await self.params(request)
+        results = []
+        for order in json.loads(params['batchOrders']):
+            try:
+                results.append(self.account.place({key: str(value) for key, value in order.items()}))
+            except (ValueError, KeyError) as e:
+                results.append({'code': getattr(e, 'code', -1102), 'msg': str(e)})
+        return web.json_response(results)
+
+    async def cancel_all(self, request):
+        params = await self.params(request)
+        self.account.cancel_all(params['symbol'])
+        return web.json_response({'code': 200, 'msg': 'The operation of cancel all open order is done.'})
+
+    async def cancel_all_algo(self, request):
+        params = await self.params(request)
+        self.account.cancel_all_algo(params['symbol'])
+        return web.json_response({'code': 200, 'msg': 'The operation of cancel all open order is done.'})
+
+    async def new_listen_key(self, request):
+        listen_key = f"sim{len(self.listen_keys) + 1}"
+        self.listen_keys.add(listen_key)
+        return web.json_response({'listenKey': listen_key})
+
+    async def keep_listen_key(self, request):
+        return web.json_response({})
+
+    async def stream(self, request):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        name = request.match_info.get('name')
+        if name in self.listen_keys:
+            await self.user_stream(ws)
+            return ws
+
+        streams = request.query['streams'].split('/') if request.query.get('streams') else []
+        if name:
+            streams.append(name)
+        subscriber = Subscriber(ws, streams, combined=name is None)
+        self.subscribers.add(subscriber)
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                request_msg = json.loads(msg.data)
+                if request_msg.get('method') == 'SUBSCRIBE':
+                    subscriber.streams.update(request_msg['params'])
+                elif request_msg.get('method') == 'UNSUBSCRIBE':
+                    subscriber.streams.difference_update(request_msg['params'])
+                await ws.send_str(json.dumps({'result': None, 'id': request_msg.get('id')}))
+        finally:
+            self.subscribers.discard(subscriber)
+        return ws
+
+    async def user_stream(self, ws):
+        queue = asyncio.Queue()
+        self.account.listeners.add(queue)
+        try:
+            while not ws.closed:
+                await ws.send_str(json.dumps(await queue.get()))
+        finally:
+            self.account.listeners.discard(queue)
+
+    async def telegram(self, request):
+        method = request.match_info['method']
+        if method == 'getMe':
+            return web.json_response({'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'sim', 'username': 'sim_bot'}})
+        params = await self.params(request)
+        if not params and request.can_read_body:
+            params = await request.json()
+        if method == 'getUpdates':
+            return await self.get_updates(params)
+        self.messages.append({'chat_id': params.get('chat_id'), 'text': params.get('text'), 'received': time.time()})
+        logger.info(f"Telegram message: {params.get('text')!r}")
+        return web.json_response({'ok': True, 'result': {
+            'message_id': len(self.messages), 'date': int(time.time()),
+            'chat': {'id': int(params.get('chat_id') or 0), 'type': 'private'}, 'text': params.get('text'),
+        }})
+
+    async def telegram_messages(self, request):
+        return web.json_response(self.messages)
+
+    # Long poll for updates after offset, like the real getUpdates
+    async def get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        deadline = time.monotonic() + float(params.get('timeout') or 0)
+        while True:
+            updates = [u for u in self.updates if u['update_id'] >= offset]
+            if updates or time.monotonic() >= deadline:
+                return web.json_response({'ok': True, 'result': updates})
+            await asyncio.sleep(0.1)
+
+    # Queue a chat message, e.g. a command, for the bots to pick up
+    async def telegram_update(self, request):
+        body = await request.json()
+        update_id = len(self.updates) + 1
+        self.updates.append({'update_id': update_id, 'message': {
+            'message_id': update_id, 'date': int(time.time()), 'text': body['text'],
+            'chat': {'id': int(body['chat_id']), 'type': 'private'},
+        }})
+        return web.json_response({'update_id': update_id})
+
+    async def start_ticker(self, app):
+        app['ticker'] = asyncio.create_task(self.run_ticker())
+
+    async def run_ticker(self):
+        last_mark = 0
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            trades = self.market.tick(self.trades_per_tick)
+            self.account.check_orders()
+            events = []
+            for symbol, price, quantity, trade_id, timestamp in trades:
+                lower = symbol.lower()
+                trade = {'e': 'trade', 'E': timestamp, 'T': timestamp, 's': symbol, 't': trade_id,
+                         'p': str(price), 'q': str(quantity), 'X': 'MARKET', 'm': False}
+                events.append((f"{lower}@trade", trade))
+                events.append((f"{lower}@aggTrade", dict(trade, e='aggTrade', a=trade_id)))
+                half_spread = price * BOOK_SPREAD / 2
+                events.append((f"{lower}@bookTicker", {'e': 'bookTicker', 'u': trade_id, 'E': timestamp, 'T': timestamp, 's': symbol,
+                                                      'b': f"{price - half_spread:.8g}", 'B': '1', 'a': f"{price + half_spread:.8g}", 'A': '1'}))
+                for interval, name in ((DAY_MS, '1d'), (HOUR_MS, '1h')):
+                    open_time = timestamp // interval * interval
+                    o, h, l, c, v = self.market.candles[(symbol, interval)][open_time]
+                    events.append((f"{lower}@kline_{name}", {'e': 'kline', 'E': timestamp, 's': symbol, 'k': {
+                        't': open_time, 'T': open_time + interval - 1, 's': symbol, 'i': name,
+                        'o': str(o), 'h': str(h), 'l': str(l), 'c': str(c), 'v': str(v), 'x': False,
+                    }}))
+            if time.time() - last_mark >= 1:
+                last_mark = time.time()
+                marks = [{'e': 'markPriceUpdate', 'E': now_ms(), 's': s, 'p': str(p), 'i': str(p)} for s, p in self.market.prices.items()]
+                events.append(('!markPrice@arr@1s', marks))
+            if self.stream_latency:
+                await asyncio.sleep(self.stream_latency)
+            await self.broadcast(events)
+
+    async def broadcast(self, events):
+        for subscriber in list(self.subscribers):
+            try:
+                for stream, data in events:
+                    if stream in subscriber.streams:
+                        await subscriber.send(stream, data)
+            except ConnectionError:
+                self.subscribers.discard(subscriber)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local Binance futures and Telegram simulator.")
+    parser.add_argument("--host", type=str, default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--symbols", type=int, default=50, help="Number of synthetic USDT symbols.")
+    parser.add_argument("--paths", type=str, help="JSON file of {symbol: [price, ...]} paths to replay.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random walk.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every REST call.")
+    parser.add_argument("--stream-latency", type=float, default=0.0, help="Seconds added before stream events go out.")
+    parser.add_argument("--tick-interval", type=float, default=0.1, help="Seconds between price steps.")
+    parser.add_argument("--trades-per-tick", type=int, default=1, help="Trades per symbol per step.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%H:%M:%S')
+    paths = None
+    if args.paths:
+        with open(args.paths, 'r') as f:
+            paths = json.load(f)
+    symbols = list(paths) if paths else ['BTCUSDT', 'ETHUSDT'] + [f"SIM{i:03d}USDT" for i in range(max(args.symbols - 2, 0))]
+    market = Market(symbols, paths, args.seed)
+    simulator = Simulator(market, args.latency, args.stream_latency, args.tick_interval, args.trades_per_tick)
+    web.run_app(simulator.app(), host=args.host, port=args.port)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import asyncio
+import logging
+import aiohttp
+from binance import AsyncClient
+from shared.metrics import metrics
+
+# Shared HTTP settings for the Binance clients of every bot.
+# aiohttp sets TCP_NODELAY on its sockets already.
+POOL_SIZE = 20  # Connections kept open per process
+WARM_CONNECTIONS = 2  # Connections opened at startup so the first orders skip the TLS handshake
+KEEPALIVE_TIMEOUT = 120  # Seconds an idle pooled connection is kept
+KEEP_WARM_INTERVAL = 30  # Seconds between pings that stop idle connections from being dropped
+DNS_CACHE_TTL = 600
+REQUEST_TIMEOUT = 10  # Seconds for a whole request
+
+# AsyncClient on a tuned connection pool, with connections opened up front.
+# futures_url replaces https://fapi.binance.com/fapi, e.g. to use the local simulator
+async def create_client(api_key, api_secret, pool_size=POOL_SIZE, timeout=REQUEST_TIMEOUT, futures_url=None, **kwargs):
+    connector = aiohttp.TCPConnector(
+        limit=pool_size,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        enable_cleanup_closed=True,
+    )
+    session_params = {
+        'connector': connector,
+        'timeout': aiohttp.ClientTimeout(total=timeout),
+        'trace_configs': [metrics.trace_config()],  # REST latencies and weights per endpoint
+    }
+    client = AsyncClient(api_key, api_secret, session_params=session_params, **kwargs)
+    if futures_url:
+        client.FUTURES_URL = futures_url
+    await warm_up(client)
+    return client
+
+async def warm_up(client, connections=WARM_CONNECTIONS):
+    results = await asyncio.gather(*(client.futures_ping() for _ in range(connections)), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logging.warning(f"Failed to warm up Binance connection: {result}")
+
+# Ping periodically so the pooled connections stay open between bursts of orders
+async def keep_warm(client, interval=KEEP_WARM_INTERVAL):
+    while True:
+        await asyncio.sleep(interval)
+        await warm_up(client, 1)
\ No newline at end of file
@@ -0,0 +1,162 @@
+import json
+import time
+import asyncio
+import logging
+import websockets
+from collections import deque
+from shared.metrics import metrics
+
+FUTURES_STREAM_URL = 'wss://fstream.binance.com'
+KEEPALIVE_INTERVAL = 30 * 60  # Binance expires a listen key after 60 minutes without keep-alive
+RESYNC_INTERVAL = 300  # Seconds between REST snapshots that catch anything the stream missed
+RECONNECT_DELAY = 5
+POSITION_WAIT = 2  # Seconds to wait for the stream to report a freshly opened position
+RECENT_UPDATES = 1000  # Stream updates kept to re-apply over a snapshot that was in flight when they arrived
+
+# One open position, parsed only for symbols with a non-zero amount
+class Position:
+    __slots__ = ('symbol', 'amount', 'entry_price', 'unrealized_pnl', 'notional')
+
+    def __init__(self, symbol, amount, entry_price, unrealized_pnl, notional):
+        self.symbol = symbol
+        self.amount = amount
+        self.entry_price = entry_price
+        self.unrealized_pnl = unrealized_pnl
+        self.notional = notional
+
+# Live positions and balance, snapshotted once and then kept current by the futures user data stream.
+# The stream only reports PnL when a position changes, so it is marked to the PriceCache in between.
+class AccountState:
+    def __init__(self, client, stream_url=FUTURES_STREAM_URL, prices=None):
+        self.client = client
+        self.stream_url = stream_url
+        self.prices = prices
+        self.positions = {}  # Symbol -> Position
+        self.usdt_wallet = 0.0
+        self.other_wallet = 0.0
+        self.maint_margin = 0.0
+        self.synced_at = None
+        self.sequence = 0  # ACCOUNT_UPDATE events applied so far
+        self.recent = deque(maxlen=RECENT_UPDATES)  # (sequence, update) of the latest ones
+        self.ready = asyncio.Event()
+        self.changed = asyncio.Condition()
+
+    def load_snapshot(self, account):
+        positions = {}
+        for p in account['positions']:
+            amount = float(p['positionAmt'])
+            if amount != 0:
+                positions[p['symbol']] = Position(
+                    p['symbol'], amount, float(p['entryPrice']), float(p['unrealizedProfit']), float(p['notional'])
+                )
+        self.positions = positions
+        usdt = next((a for a in account['assets'] if a['asset'] == 'USDT'), None)
+        self.usdt_wallet = float(usdt['walletBalance']) if usdt else 0.0
+        self.other_wallet = float(account['totalWalletBalance']) - self.usdt_wallet
+        self.maint_margin = float(account['totalMaintMargin'])
+        self.synced_at = time.time()
+
+    # Replace the state with a REST snapshot, then re-apply the stream updates that arrived while
+    # it was in flight. The updates carry absolute amounts and balances, so applying one twice is harmless.
+    async def snapshot(self):
+        issued = self.sequence
+        account = await self.client.futures_account()
+        async with self.changed:
+            self.load_snapshot(account)
+            for sequence, update in self.recent:
+                if sequence > issued:
+                    self.apply_account_update(update)
+            self.changed.notify_all()
+        self.ready.set()
+
+    def apply_account_update(self, update):
+        for b in update.get('B', []):
+            if b['a'] == 'USDT':
+                self.usdt_wallet = float(b['wb'])
+        for p in update.get('P', []):
+            amount = float(p['pa'])
+            if amount == 0:
+                self.positions.pop(p['s'], None)
+                continue
+            entry_price = float(p['ep'])
+            mark = self.mark_price(p['s']) or entry_price  # Notional is mark based, as in the snapshot
+            self.positions[p['s']] = Position(p['s'], amount, entry_price, float(p['up']), amount * mark)
+
+    async def handle(self, event):
+        async with self.changed:
+            if event['e'] == 'ACCOUNT_UPDATE':
+                self.sequence += 1
+                self.recent.append((self.sequence, event['a']))
+                self.apply_account_update(event['a'])
+            self.changed.notify_all()
+
+    def mark_price(self, symbol):
+        return self.prices.mark_price(symbol) if self.prices is not None else None
+
+    # Unrealized PnL and notional of a position at the latest mark price, as last reported without one
+    def marked(self, position):
+        mark = self.mark_price(position.symbol)
+        if mark is None:
+            return position.unrealized_pnl, position.notional
+        return position.amount * (mark - position.entry_price), position.amount * mark
+
+    # Margin balance, margin ratio and PnL at the latest mark prices. The maintenance margin is from the last snapshot
+    def balance(self):
+        unrealized_pnl = sum(self.marked(p)[0] for p in self.positions.values())
+        margin_balance = self.usdt_wallet + self.other_wallet + unrealized_pnl
+        margin_ratio = self.maint_margin / margin_balance if margin_balance else 0.0
+        return margin_balance, margin_ratio, unrealized_pnl
+
+    # Position for a symbol once the stream has reported it, falling back to a snapshot
+    async def wait_for_position(self, symbol, timeout=POSITION_WAIT):
+        async with self.changed:
+            try:
+                await asyncio.wait_for(self.changed.wait_for(lambda: symbol in self.positions), timeout)
+            except asyncio.TimeoutError:
+                pass
+        if symbol not in self.positions:
+            await self.snapshot()
+        return self.positions.get(symbol)
+
+    async def keepalive(self, listen_key):
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+            try:
+                await self.client.futures_stream_keepalive(listenKey=listen_key)
+            except Exception as e:
+                logging.error(f"Error keeping user data stream alive: {e}")
+
+    async def resync(self):
+        while True:
+            await asyncio.sleep(RESYNC_INTERVAL)
+            try:
+                await self.snapshot()
+            except Exception as e:
+                logging.error(f"Error refreshing account snapshot: {e}")
+
+    async def run(self):
+        resync = asyncio.create_task(self.resync())
+        try:
+            while True:
+                try:
+                    listen_key = await self.client.futures_stream_get_listen_key()
+                    async with websockets.connect(f'{self.stream_url}/ws/{listen_key}') as websocket:
+                        await self.snapshot()  # Taken after connecting so no event falls in between
+                        keepalive = asyncio.create_task(self.keepalive(listen_key))
+                        try:
+                            async for msg in websocket:
+                                event = json.loads(msg)
+                                if event.get('e') == 'listenKeyExpired':
+                                    logging.warning("User data stream listen key expired, reconnecting")
+                                    break
+                                await self.handle(event)
+                        finally:
+                            keepalive.cancel()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.error(f"User data stream error: {e}")
+                metrics.inc('stream_reconnects_total', stream='user_data')
+                await asyncio.sleep(RECONNECT_DELAY)
+        finally:
+            resync.cancel()
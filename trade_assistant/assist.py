@@ -1,10 +1,21 @@
 import os
+import sys
+import time
 import logging
 from dotenv import load_dotenv
 from telethon import TelegramClient, events
-from binance import AsyncClient
-import pandas as pd
 import asyncio
+from functools import partial
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.transport import create_client, keep_warm
+from shared.metrics import metrics
+
+from symbol_info import SymbolInfoCache
+from account_state import AccountState
+from price_cache import PriceCache
+from pair_monitor import PairMonitor
+from scheduler import CommandScheduler
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logging.getLogger('telethon').setLevel(logging.WARNING)  # Suppress Telethon INFO messages
@@ -18,12 +29,22 @@ BI_API_SECRET = os.getenv("BI_API_SECRET")
 TEL_CHAT = os.getenv("TEL_CHAT")
 # Liq tracking update
 LIQ_TEL_CHAT = int(os.getenv("LIQ_TEL_CHAT"))
+# Endpoints, only changed to run against the local simulator
+BI_FUTURES_URL = os.getenv("BI_FUTURES_URL")
+BI_STREAM_URL = os.getenv("BI_STREAM_URL", "wss://fstream.binance.com")
+BI_SPOT_STREAM_URL = os.getenv("BI_SPOT_STREAM_URL", "wss://stream.binance.com:9443")
 LIQ_stop_ratio = 0.5
 LIQ_tp_ratio = 0.5
 LIQ_size = 75
 LIQ_enabled = False
 LIQ_short_enabled = True
 LIQ_long_enabled = True
+COMMAND_WORKERS = 8  # Commands on different symbols that can run at the same time
+MAX_CONCURRENT_ORDERS = 10  # Orders in flight at once, well under Binance's order rate limits
+# Close pair legs in this process instead of running pair_manager.py
+PAIRS_DIRECT = os.getenv("PAIRS_DIRECT", "false").lower() == "true"
+# Local port serving Prometheus metrics, 0 to turn it off
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9102"))
 
 tel_client = TelegramClient(
     'anon',
@@ -32,35 +53,25 @@ tel_client = TelegramClient(
     device_model="Linux",
     system_version="4.16.30-CUSTOM"
 )
-bi_client = AsyncClient(BI_API_KEY, BI_API_SECRET)
+price_cache = PriceCache(BI_STREAM_URL)
+scheduler = CommandScheduler(COMMAND_WORKERS)
 
 async def get_open_positions():
-    try:
-        positions = await bi_client.futures_account()
-        df = pd.DataFrame(positions['positions'])
-        df = df[df['maintMargin'] != '0']
-        return df[['symbol', 'unrealizedProfit', 'entryPrice', 'positionAmt', 'notional']]
-    except Exception as e:
-        logging.error(f"Error fetching open positions: {e}")
-        return pd.DataFrame()
+    return account.positions
 
 async def get_precision(symbol):
-    info = await bi_client.futures_exchange_info()
-    for x in info['symbols']:
-        if x['symbol'] == symbol:
-            return int(x['quantityPrecision'])
-        
+    info = await symbol_info.get(symbol)
+    if info:
+        return info['quantity_precision']
+
 async def get_tick_size(symbol):
-    info = await bi_client.futures_exchange_info()
-    for s in info['symbols']:
-        if s['symbol'] == symbol:
-            for f in s['filters']:
-                if f['filterType'] == 'PRICE_FILTER':
-                    tick_size_str = f['tickSize'].rstrip('0')
-                    return len(tick_size_str.split('.')[1]) if '.' in tick_size_str else 0
-    return 0
+    info = await symbol_info.get(symbol)
+    return info['price_precision'] if info else 0
 
 async def get_last_price(symbol):
+    price = price_cache.index_price(symbol)
+    if price is not None:
+        return price
     price = await bi_client.futures_mark_price(symbol=symbol)
     return float(price['indexPrice'])
 
@@ -86,74 +97,92 @@ async def place_order(side, symbol, amount, order_type='MARKET', price=None):
         logging.error(f"Failed to place order: {e}")
         return {}
 
+async def close_order(position):
+    side = 'SELL' if position.amount > 0 else 'BUY'
+    return await bi_client.futures_create_order(
+        symbol=position.symbol,
+        type='MARKET',
+        side=side,
+        quantity=abs(position.amount),
+        reduceOnly='true'
+    )
+
 async def close_position(coin):
     positions = await get_open_positions()
-    posses = positions.set_index('symbol').T.to_dict()
-    if coin + 'USDT' in posses:
-        pos_Amt = float(posses[coin + 'USDT']['positionAmt'])
-        side = 'SELL' if pos_Amt > 0 else 'BUY'
-        return await bi_client.futures_create_order(
-            symbol=coin + 'USDT',
-            type='MARKET',
-            side=side,
-            quantity=abs(pos_Amt)
-        )
+    position = positions.get(coin + 'USDT')
+    if position:
+        return await close_order(position)
     return {}
 
+# Close every position from one snapshot, with the closes and order cancels running concurrently.
+# Each symbol is flattened as a job on its scheduler key, after the jobs already queued for it.
 async def close_all_positions():
-    positions = await get_open_positions()
-    if positions.empty:
-        return "No open positions to close."
-    results = []
-    for index, row in positions.iterrows():
-        symbol = row['symbol']
-        result = await close_position(symbol.replace('USDT', ''))
-        results.append(result)
-    return results
-
+    positions = list((await get_open_positions()).values())
+    started = time.monotonic()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_ORDERS)
+
+    async def flatten(position):
+        position = account.positions.get(position.symbol)  # Earlier jobs may have resized or closed it
+        if position is None:
+            return None, None
+        async with semaphore:
+            close, cancel = await asyncio.gather(close_order(position), cancel_all_orders(position.symbol), return_exceptions=True)
+        if isinstance(close, Exception):
+            logging.error(f"Failed to close {position.symbol}: {close}")
+            close = {}
+        return close, cancel
+
+    results = await asyncio.gather(*(scheduler.call(position.symbol, partial(flatten, position)) for position in positions))
+    # A close of None means the position was already closed by the time its job ran
+    return {position.symbol: result for position, result in zip(positions, results)}, time.monotonic() - started
+
+# Cancel the regular open orders and the conditional ones (stops and take profits) on the algo endpoint
 async def cancel_all_orders(symbol):
-    try:
-        result = await bi_client.futures_cancel_all_open_orders(symbol=symbol)
-        return result
-    except Exception as e:
-        logging.error(f"Failed to cancel orders: {e}")
-        return {}
+    results = await asyncio.gather(
+        bi_client.futures_cancel_all_open_orders(symbol=symbol),
+        bi_client.futures_cancel_all_algo_open_orders(symbol=symbol),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logging.error(f"Failed to cancel orders: {result}")
+            return {}
+    return results[0]
 
 async def list_positions():
     positions = await get_open_positions()
-    if positions.empty:
+    if not positions:
         return "No open positions."
     result = ''
-    for index, row in positions.iterrows():
-        result += (f"{row['symbol']}:\n"
-                   f"  Entry: {row['entryPrice']}\n"
-                   f"  Size: {round(float(row['notional']), 2)}\n"
-                   f"  PnL: {round(float(row['unrealizedProfit']), 2)}\n\n")
+    for position in positions.values():
+        unrealized_pnl, notional = account.marked(position)
+        result += (f"{position.symbol}:\n"
+                   f"  Entry: {position.entry_price}\n"
+                   f"  Size: {round(notional, 2)}\n"
+                   f"  PnL: {round(unrealized_pnl, 2)}\n\n")
     return result.strip()
 
 async def get_balance():
-    try:
-        account_info = await bi_client.futures_account()
-        margin_balance = float(account_info['totalMarginBalance'])
-        margin_ratio = float(account_info['totalMaintMargin']) / float(account_info['totalMarginBalance'])
-        unrealized_pnl = float(account_info['totalCrossUnPnl'])
-        return margin_balance, margin_ratio, unrealized_pnl
-    except Exception as e:
-        logging.error(f"Error fetching balance: {e}")
+    if not account.ready.is_set():
+        logging.error("Error fetching balance: account state not loaded yet")
         return None, None, None
+    return account.balance()
+
+# Regular orders are acknowledged with an orderId, conditional ones on the algo endpoint with an algoId
+def order_placed(result):
+    return isinstance(result, dict) and ('orderId' in result or 'algoId' in result)
 
 async def set_stop_order(symbol, stop_price, order_type):
     positions = await get_open_positions()
-    posses = positions.set_index('symbol').T.to_dict()
-    if symbol in posses:
-        pos_Amt = float(posses[symbol]['positionAmt'])
-        side = 'SELL' if pos_Amt > 0 else 'BUY'
+    position = positions.get(symbol)
+    if position:
+        side = 'SELL' if position.amount > 0 else 'BUY'
         try:
-            stop_order = await bi_client.futures_create_order(
+            stop_order = await bi_client.futures_create_algo_order(
                 symbol=symbol,
                 side=side,
                 type=order_type,
-                stopPrice=stop_price,
+                triggerPrice=stop_price,
                 closePosition='true'
             )
             return stop_order
@@ -163,6 +192,53 @@ async def set_stop_order(symbol, stop_price, order_type):
     else:
         return "No open position for this symbol."
 
+def liq_exit_prices(entry_price, direction, precision):
+    stop_adjustment = entry_price * (LIQ_stop_ratio / 100)
+    tp_adjustment = entry_price * (LIQ_tp_ratio / 100)
+    stop_price = round(entry_price - stop_adjustment if direction == "BUY" else entry_price + stop_adjustment, precision)
+    tp_price = round(entry_price + tp_adjustment if direction == "BUY" else entry_price - tp_adjustment, precision)
+    return stop_price, tp_price
+
+# Open a position and send its stop and take profit at the same time. Binance only takes
+# conditional orders on the algo endpoint, so they can't share a batch with the entry.
+# Exits are priced off the index price used for sizing, the expected fill.
+async def open_protected_position(direction, symbol, amount):
+    price, info, _ = await asyncio.gather(get_last_price(symbol), symbol_info.get(symbol), cancel_all_orders(symbol))
+    if info is None:
+        logging.error(f"Failed to place order: unknown symbol {symbol}")
+        return None
+
+    quantity = f"{round(amount / price, info['quantity_precision']):.{info['quantity_precision']}f}"
+    exit_side = 'SELL' if direction == 'BUY' else 'BUY'
+    stop_price, tp_price = liq_exit_prices(price, direction, info['price_precision'])
+    results = await asyncio.gather(
+        bi_client.futures_create_order(symbol=symbol, side=direction, type='MARKET', quantity=quantity, newOrderRespType='RESULT'),
+        bi_client.futures_create_algo_order(symbol=symbol, side=exit_side, type='STOP_MARKET', quantity=quantity, reduceOnly='true',
+                                            triggerPrice=f"{stop_price:.{info['price_precision']}f}"),
+        bi_client.futures_create_algo_order(symbol=symbol, side=exit_side, type='TAKE_PROFIT_MARKET', quantity=quantity, reduceOnly='true',
+                                            triggerPrice=f"{tp_price:.{info['price_precision']}f}"),
+        return_exceptions=True
+    )
+    entry_order, stop_order, tp_order = results
+    for name, result in zip(('entry', 'stop', 'take profit'), results):
+        if isinstance(result, Exception):
+            logging.error(f"Failed to place {name} order for {symbol}: {result}")
+    if not order_placed(entry_order):
+        if order_placed(stop_order) or order_placed(tp_order):
+            try:  # Don't leave exits behind for a position that never opened
+                await bi_client.futures_cancel_all_algo_open_orders(symbol=symbol)
+            except Exception as e:
+                logging.error(f"Failed to cancel exits for {symbol}: {e}")
+        return None
+    stop_order = stop_order if order_placed(stop_order) else {}
+    tp_order = tp_order if order_placed(tp_order) else {}
+    return entry_order, stop_order, tp_order, stop_price, tp_price
+
+# Retry an exit that was rejected, once the position is live
+async def retry_exit_order(symbol, stop_price, order_type):
+    await account.wait_for_position(symbol)
+    return await set_stop_order(symbol, stop_price, order_type)
+
 async def handle_long(msg):
     if len(msg) < 3:
         return "Failed"
@@ -200,8 +276,18 @@ async def handle_close(msg):
     return "Done" if "orderId" in result else "Failed"
 
 async def handle_closeall(_):
-    results = await close_all_positions()
-    return "Done" if all("orderId" in result for result in results) else "Failed"
+    results, elapsed = await close_all_positions()
+    if not results:
+        return "No open positions to close."
+    response = ''
+    for symbol, (close, cancel) in results.items():
+        if close is None:
+            response += f"{symbol}: Already closed\n"
+            continue
+        response += f"{symbol}: {'Done' if 'orderId' in close else 'Failed'}"
+        response += "\n" if cancel.get('code') == 200 else " (orders not cancelled)\n"
+    closed = sum(close is None or 'orderId' in close for close, _ in results.values())
+    return response + f"Closed {closed}/{len(results)} in {elapsed:.2f}s"
 
 async def handle_balance(_):
     margin_balance, margin_ratio, unrealized_pnl = await get_balance()
@@ -217,7 +303,7 @@ async def handle_tp(msg):
     try:
         target_price = float(msg[2])
         result = await set_stop_order(symbol, target_price, 'TAKE_PROFIT_MARKET')
-        return "Done" if "orderId" in result else "Failed"
+        return "Done" if order_placed(result) else "Failed"
     except ValueError:
         return "Failed"
 
@@ -228,7 +314,7 @@ async def handle_stop(msg):
     try:
         stop_price = float(msg[2])
         result = await set_stop_order(symbol, stop_price, 'STOP_MARKET')
-        return "Done" if "orderId" in result else "Failed"
+        return "Done" if order_placed(result) else "Failed"
     except ValueError:
         return "Failed"
 
@@ -321,6 +407,9 @@ async def set_liq_disable(msg):
         LIQ_long_enabled = False
         return "Done"
 
+async def handle_stats(_):
+    return metrics.report("assist")
+
 async def liq_settings(_):
     return f"Size: {LIQ_size}\nTP: {LIQ_tp_ratio}\nStop: {LIQ_stop_ratio}\nEnabled: {LIQ_enabled}\nShort Enabled: {LIQ_short_enabled}\nLong Enabled: {LIQ_long_enabled}"
 
@@ -341,9 +430,12 @@ COMMAND_HANDLERS = {
     'liqtp': set_liq_tp_ratio,
     'liqenable': set_liq_enable,
     'liqdisable': set_liq_disable,
-    'liqsettings': liq_settings
+    'liqsettings': liq_settings,
+    'stats': handle_stats
 }
 
+SYMBOL_COMMANDS = {'long', 'short', 'close', 'tp', 'stop', 'limitbuy', 'limitsell', 'cancelall'}
+
 @tel_client.on(events.NewMessage(chats=TEL_CHAT))
 async def handle_commands(event):
     if not event.message.text.startswith('/'):
@@ -354,18 +446,29 @@ async def handle_commands(event):
 
     handler = COMMAND_HANDLERS.get(command)
     if handler:
+        scheduler.submit(command_key(command, msg), partial(run_command, handler, msg))
+    else:
+        await tel_client.send_message(TEL_CHAT, "Unsupported command")
+
+# Commands on the same symbol, including liquidation trades, run one after another
+def command_key(command, msg):
+    if command in SYMBOL_COMMANDS and len(msg) > 1:
+        return msg[1].upper() + 'USDT'
+    return command
+
+async def run_command(handler, msg):
+    with metrics.timer('command_seconds', command=msg[0][1:].lower()):
         response = await handler(msg)
         if response:
             await tel_client.send_message(TEL_CHAT, response)
         else:
             await tel_client.send_message(TEL_CHAT, "No response generated.")
-    else:
-        await tel_client.send_message(TEL_CHAT, "Unsupported command")
 
 @tel_client.on(events.NewMessage(chats=LIQ_TEL_CHAT))
 async def handle_liquidation_notifications(event):
     if not LIQ_enabled:
         return
+    received = time.time()
         
     message_text = event.message.text
     
@@ -386,29 +489,40 @@ async def handle_liquidation_notifications(event):
         return
 
     symbol = f"{ticker}USDT"
-    
-    positions = await get_open_positions()
-    existing_position = positions[positions['symbol'] == symbol]
-    if not existing_position.empty and float(existing_position['positionAmt'].iloc[0]) != 0:
-        return
-    await cancel_all_orders(symbol)
-    
-    size = LIQ_size
-    order = await place_order(direction, symbol, size)
-    if "orderId" not in order:
-        await tel_client.send_message(TEL_CHAT, f"Failed to open position for {ticker}.")
-        return
+    metrics.observe('liquidation_stage_seconds', received - event.message.date.timestamp(), stage='signal_to_receive')
+    scheduler.submit(symbol, partial(open_liquidation_trade, ticker, direction, received))
 
-    positions = await get_open_positions()
-    entry_price = float(positions.loc[positions['symbol'] == symbol, 'entryPrice'].iloc[0])
+# Signal receive -> order ack -> stop/TP ack timings of a liquidation trade
+def record_liquidation_stage(stage, received):
+    metrics.observe('liquidation_stage_seconds', time.time() - received, stage=stage)
 
-    stop_adjustment = entry_price * (LIQ_stop_ratio / 100)
-    tp_adjustment = entry_price * (LIQ_tp_ratio / 100)
-    stop_price = round(entry_price - stop_adjustment if direction == "BUY" else entry_price + stop_adjustment, await get_tick_size(symbol))
-    tp_price = round(entry_price + tp_adjustment if direction == "BUY" else entry_price - tp_adjustment, await get_tick_size(symbol))
+async def open_liquidation_trade(ticker, direction, received):
+    symbol = f"{ticker}USDT"
+    if symbol in account.positions:
+        return
 
-    stop_order_result = await set_stop_order(symbol, stop_price, 'STOP_MARKET')
-    tp_order_result = await set_stop_order(symbol, tp_price, 'TAKE_PROFIT_MARKET')
+    record_liquidation_stage('receive_to_start', received)
+    result = await open_protected_position(direction, symbol, LIQ_size)
+    record_liquidation_stage('receive_to_order_ack', received)
+    if result is None:
+        await tel_client.send_message(TEL_CHAT, f"Failed to open position for {ticker}.")
+        return
+    order, stop_order_result, tp_order_result, stop_price, tp_price = result
+    entry_price = float(order.get('avgPrice') or 0)
+
+    retries = []
+    if not order_placed(stop_order_result):
+        retries.append(retry_exit_order(symbol, stop_price, 'STOP_MARKET'))
+    if not order_placed(tp_order_result):
+        retries.append(retry_exit_order(symbol, tp_price, 'TAKE_PROFIT_MARKET'))
+    if retries:
+        retried = iter(await asyncio.gather(*retries))
+        if not order_placed(stop_order_result):
+            stop_order_result = next(retried)
+        if not order_placed(tp_order_result):
+            tp_order_result = next(retried)
+    if order_placed(stop_order_result) and order_placed(tp_order_result):
+        record_liquidation_stage('receive_to_exits_ack', received)
 
     notification = (
         f"Opened {ticker} {direction} position:\n"
@@ -418,13 +532,44 @@ async def handle_liquidation_notifications(event):
     )
     await tel_client.send_message(TEL_CHAT, notification)
 
-    if 'orderId' not in stop_order_result:
+    if not order_placed(stop_order_result):
         await tel_client.send_message(TEL_CHAT, f"Failed to set stop for {ticker}")
 
-    if 'orderId' not in tp_order_result:
+    if not order_placed(tp_order_result):
         await tel_client.send_message(TEL_CHAT, f"Failed to set tp for {ticker}")
 
+    await account.wait_for_position(symbol)  # Let the next job on this symbol see the position
+
+# Close both legs of a breached pair, each in order with the other jobs on its symbol
+async def handle_pair_breach(rule, price):
+    results = await asyncio.gather(*(scheduler.call(leg.upper() + 'USDT', partial(close_position, leg.upper()))
+                                     for leg in rule['legs']), return_exceptions=True)
+    notification = f"{rule['symbol']} left {rule['low']}-{rule['high']} at {price}:"
+    for leg, result in zip(rule['legs'], results):
+        if isinstance(result, Exception):
+            logging.error(f"Failed to close {leg}: {result}")
+            result = {}
+        notification += f"\n  - Close {leg.upper()}: {'Done' if 'orderId' in result else 'Failed'}"
+    await tel_client.send_message(TEL_CHAT, notification)
+
 async def main():
+    global bi_client, symbol_info, account
+    bi_client = await create_client(BI_API_KEY, BI_API_SECRET, futures_url=BI_FUTURES_URL)
+    symbol_info = SymbolInfoCache(bi_client)
+    account = AccountState(bi_client, BI_STREAM_URL, price_cache)
+    asyncio.create_task(keep_warm(bi_client))
+    await symbol_info.start()
+    asyncio.create_task(symbol_info.run())
+    asyncio.create_task(account.run())
+    asyncio.create_task(price_cache.run())
+    asyncio.create_task(scheduler.run())
+    metrics.set('queue_depth', scheduler.depth, queue='commands')
+    metrics.set('open_positions', lambda: len(account.positions))
+    if METRICS_PORT:
+        await metrics.serve(METRICS_PORT)
+    if PAIRS_DIRECT:
+        asyncio.create_task(PairMonitor(handle_pair_breach, url=BI_SPOT_STREAM_URL).run())
+    await account.ready.wait()
     await tel_client.start()
     logging.info("Bot started and listening...")
     await tel_client.run_until_disconnected()
@@ -1,60 +1,89 @@
 import os
-import time
 import sys
+import asyncio
+import logging
 from dotenv import load_dotenv
-from telethon import TelegramClient
-from binance.client import Client
+from telethon import TelegramClient, events
 import argparse
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.metrics import metrics
+
+from pair_monitor import PairMonitor, RULES_FILE, load_rules, save_rules
+
 load_dotenv()
 
-parser = argparse.ArgumentParser(description="Monitor cryptocurrency prices and send alerts via Telegram.")
-parser.add_argument("symbol", type=str, help="The symbol of the cryptocurrency pair to monitor (e.g., SHIBDOGE).")
-parser.add_argument("low", type=float, help="The lower price threshold.")
-parser.add_argument("high", type=float, help="The higher price threshold.")
-parser.add_argument("mainsymbol", type=str, help="The main symbol.")
-parser.add_argument("secsymbol", type=str, help="The secondary pair.")
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.getLogger('telethon').setLevel(logging.WARNING)
+
+parser = argparse.ArgumentParser(description="Monitor cryptocurrency pairs and send close commands via Telegram.")
+parser.add_argument("--rules", type=str, default=RULES_FILE, help="The file holding the pair rules.")
+commands = parser.add_subparsers(dest="command")
+add_parser = commands.add_parser("add", help="Add or replace a pair rule.")
+add_parser.add_argument("symbol", type=str, help="The symbol of the cryptocurrency pair to monitor (e.g., SHIBDOGE).")
+add_parser.add_argument("low", type=float, help="The lower price threshold.")
+add_parser.add_argument("high", type=float, help="The higher price threshold.")
+add_parser.add_argument("mainsymbol", type=str, help="The main symbol.")
+add_parser.add_argument("secsymbol", type=str, help="The secondary pair.")
+remove_parser = commands.add_parser("remove", help="Remove a pair rule.")
+remove_parser.add_argument("symbol", type=str, help="The symbol of the pair to stop monitoring.")
+commands.add_parser("list", help="List the pair rules.")
 args = parser.parse_args()
 
 TEL_API_ID = int(os.getenv("TEL_API_ID"))
 TEL_API_HASH = os.getenv("TEL_API_HASH")
-BI_API_KEY = os.getenv("BI_API_KEY")
-BI_API_SECRET = os.getenv("BI_API_SECRET")
 TEL_CHAT = os.getenv("TEL_CHAT")
+BI_SPOT_STREAM_URL = os.getenv("BI_SPOT_STREAM_URL", "wss://stream.binance.com:9443")
+# Local port serving Prometheus metrics, 0 to turn it off. Separate from assist.py's METRICS_PORT, both read the same .env
+PAIR_METRICS_PORT = int(os.getenv("PAIR_METRICS_PORT", "9103"))
 
-PRICE_THRESHOLD_LOW = args.low
-PRICE_THRESHOLD_HIGH = args.high
-SYMBOL = args.symbol
-MAIN_SYMBOL = args.mainsymbol
-SEC_SYMBOL = args.secsymbol
-CHECK_INTERVAL = 300
-
-tel_client = tel_client = TelegramClient(
-    'pair',
-    TEL_API_ID,
-    TEL_API_HASH,
-    device_model="Ubuntu",
-    system_version="4.16.31-CUSTOM"
+tel_client = TelegramClient(
+    'pair',
+    TEL_API_ID,
+    TEL_API_HASH,
+    device_model="Ubuntu",
+    system_version="4.16.31-CUSTOM"
 )
-bi_client = Client(BI_API_KEY, BI_API_SECRET)
 
-def check_price():
-    ticker = bi_client.get_symbol_ticker(symbol=SYMBOL)
-    current_price = float(ticker['price'])
-    if current_price <= PRICE_THRESHOLD_LOW or current_price >= PRICE_THRESHOLD_HIGH:
-        send_alert()
-        sys.exit()
+async def send_alert(rule, price):
+    logging.info(f"{rule['symbol']} left {rule['low']}-{rule['high']} at {price}")
+    for leg in rule['legs']:
+        await tel_client.send_message(TEL_CHAT, "/close " + leg)
+
+# /stats in the same chat is answered by assist.py
+@tel_client.on(events.NewMessage(chats=TEL_CHAT, pattern=r'(?i)^/pairstats\b'))
+async def handle_stats(event):
+    await tel_client.send_message(TEL_CHAT, metrics.report("pair_manager"))
 
-def send_alert():
-    with tel_client:
-        tel_client.loop.run_until_complete(tel_client.send_message(TEL_CHAT, "/close " + MAIN_SYMBOL))
-        tel_client.loop.run_until_complete(tel_client.send_message(TEL_CHAT, "/close " + SEC_SYMBOL))
+def edit_rules():
+    rules = load_rules(args.rules)
+    if args.command == "add":
+        symbol = args.symbol.upper()
+        rules = [r for r in rules if r['symbol'].upper() != symbol]
+        rules.append({'symbol': symbol, 'low': args.low, 'high': args.high, 'legs': [args.mainsymbol, args.secsymbol]})
+        save_rules(rules, args.rules)
+    elif args.command == "remove":
+        rules = [r for r in rules if r['symbol'].upper() != args.symbol.upper()]
+        save_rules(rules, args.rules)
+    for r in rules:
+        print(f"{r['symbol']}: {r['low']} - {r['high']} -> {', '.join(r['legs'])}")
 
-def main():
-    with tel_client:
-        while True:
-            check_price()
-            time.sleep(CHECK_INTERVAL)
+async def main():
+    await tel_client.start()
+    if PAIR_METRICS_PORT:
+        await metrics.serve(PAIR_METRICS_PORT)
+    monitor = PairMonitor(send_alert, args.rules, BI_SPOT_STREAM_URL)
+    metrics.set('watched_pairs', lambda: len(monitor.rules))
+    await monitor.run()
 
 if __name__ == '__main__':
-    main()
+    if args.command:
+        edit_rules()
+        sys.exit()
+    loop = asyncio.get_event_loop()
+    try:
+        loop.run_until_complete(main())
+    except KeyboardInterrupt:
+        logging.info("Shutting down...")
+    finally:
+        loop.close()
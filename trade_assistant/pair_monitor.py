@@ -0,0 +1,128 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import websockets
+from websockets.exceptions import ConnectionClosed
+from shared.metrics import metrics
+
+SPOT_STREAM_URL = 'wss://stream.binance.com:9443'
+RULES_FILE = 'pairs.json'
+RELOAD_INTERVAL = 5  # Seconds between checks of the rules file for changes
+RECONNECT_DELAY = 5
+RETRY_DELAY = 5  # Seconds before a rule whose legs failed to close is armed again
+
+# A pair rule is {'symbol': 'SHIBDOGE', 'low': 0.1, 'high': 0.2, 'legs': ['SHIB', 'DOGE']}
+def load_rules(path=RULES_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_rules(rules, path=RULES_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(rules, f, indent=2)
+    os.replace(tmp_path, path)
+
+# Watches many pairs on one spot trade stream and calls on_breach(rule, price) when a band is broken
+class PairMonitor:
+    def __init__(self, on_breach, path=RULES_FILE, url=SPOT_STREAM_URL):
+        self.on_breach = on_breach
+        self.path = path
+        self.url = f'{url}/stream'
+        self.rules = {}  # Symbol -> rule
+        self.firing = {}  # Symbol -> task closing the legs of a breached rule
+        self.websocket = None
+        self.request_id = 0
+        self.loaded_mtime = None
+
+    async def send(self, method, symbols):
+        if self.websocket is None or not symbols:
+            return  # Sent on connect instead
+        self.request_id += 1
+        params = [f"{symbol.lower()}@aggTrade" for symbol in symbols]
+        try:
+            await self.websocket.send(json.dumps({'method': method, 'params': params, 'id': self.request_id}))
+        except ConnectionClosed:
+            pass  # The stream resubscribes every rule when it reconnects
+
+    # Replace the watched rules, subscribing only to symbols that changed
+    async def set_rules(self, rules):
+        rules = {rule['symbol'].upper(): rule for rule in rules}
+        removed = [symbol for symbol in self.rules if symbol not in rules]
+        added = [symbol for symbol in rules if symbol not in self.rules]
+        self.rules = rules
+        await self.send('UNSUBSCRIBE', removed)
+        await self.send('SUBSCRIBE', added)
+        logging.info(f"Watching {len(self.rules)} pairs, +{len(added)} -{len(removed)}")
+
+    def check(self, symbol, price):
+        rule = self.rules.get(symbol)
+        if rule is None or symbol in self.firing or rule['low'] < price < rule['high']:
+            return
+        del self.rules[symbol]  # Each rule fires once
+        self.firing[symbol] = asyncio.create_task(self.breach(symbol, rule, price, time.perf_counter()))
+
+    # Drop a fired rule from the file so a reload doesn't bring it back
+    def forget(self, symbol):
+        self.rules.pop(symbol, None)  # In case a reload brought it back while it was firing
+        try:
+            rules = [r for r in load_rules(self.path) if r['symbol'].upper() != symbol]
+            save_rules(rules, self.path)
+            self.loaded_mtime = os.path.getmtime(self.path)
+        except (OSError, ValueError) as e:
+            logging.error(f"Error removing {symbol} from {self.path}: {e}")
+
+    # Close the legs of a breached rule. The rule is only forgotten once that worked,
+    # otherwise it is armed again to fire on a later trade, and stays in the file for a restart
+    async def breach(self, symbol, rule, price, detected):
+        try:
+            await self.send('UNSUBSCRIBE', [symbol])
+            try:
+                await self.on_breach(rule, price)
+            except Exception as e:
+                logging.error(f"Failed to close the legs of {symbol}: {e}")
+                await asyncio.sleep(RETRY_DELAY)
+                self.rules.setdefault(symbol, rule)
+                await self.send('SUBSCRIBE', [symbol])
+                return
+            metrics.observe('pair_breach_seconds', time.perf_counter() - detected)
+            self.forget(symbol)
+        finally:
+            del self.firing[symbol]
+
+    # Pick up rules added to or removed from the file while running
+    async def watch_rules(self):
+        while True:
+            try:
+                mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+                if mtime != self.loaded_mtime:
+                    self.loaded_mtime = mtime
+                    await self.set_rules(load_rules(self.path))
+            except (OSError, ValueError) as e:
+                logging.error(f"Error loading {self.path}: {e}")
+            await asyncio.sleep(RELOAD_INTERVAL)
+
+    async def stream(self):
+        while True:
+            try:
+                async with websockets.connect(self.url) as websocket:
+                    self.websocket = websocket
+                    await self.send('SUBSCRIBE', list(self.rules))
+                    async for msg in websocket:
+                        event = json.loads(msg)
+                        if 'data' in event:
+                            self.check(event['data']['s'], float(event['data']['p']))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Pair price stream error: {e}")
+            finally:
+                self.websocket = None
+            metrics.inc('stream_reconnects_total', stream='pairs')
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def run(self):
+        await asyncio.gather(self.watch_rules(), self.stream())
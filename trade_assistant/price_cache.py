@@ -0,0 +1,48 @@
+import json
+import time
+import asyncio
+import logging
+import websockets
+from shared.metrics import metrics
+
+FUTURES_STREAM_URL = 'wss://fstream.binance.com'
+MAX_PRICE_AGE = 5  # Seconds before a cached price is too old to size orders with
+RECONNECT_DELAY = 5
+
+# Latest mark and index price of every futures symbol, fed by the all-market mark price stream
+class PriceCache:
+    def __init__(self, stream_url=FUTURES_STREAM_URL):
+        self.url = f'{stream_url}/ws/!markPrice@arr@1s'
+        self.prices = {}  # Symbol -> (mark price, index price, received at)
+
+    def update(self, events):
+        now = time.monotonic()
+        for event in events:
+            self.prices[event['s']] = (float(event['p']), float(event['i']), now)
+
+    def get(self, symbol, max_age=MAX_PRICE_AGE):
+        entry = self.prices.get(symbol)
+        if entry is None or time.monotonic() - entry[2] > max_age:
+            return None
+        return entry
+
+    def index_price(self, symbol, max_age=MAX_PRICE_AGE):
+        entry = self.get(symbol, max_age)
+        return entry[1] if entry else None
+
+    def mark_price(self, symbol, max_age=MAX_PRICE_AGE):
+        entry = self.get(symbol, max_age)
+        return entry[0] if entry else None
+
+    async def run(self):
+        while True:
+            try:
+                async with websockets.connect(self.url) as websocket:
+                    async for msg in websocket:
+                        self.update(json.loads(msg))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Mark price stream error: {e}")
+            metrics.inc('stream_reconnects_total', stream='mark_price')
+            await asyncio.sleep(RECONNECT_DELAY)
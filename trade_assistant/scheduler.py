@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from collections import deque
+
+# Runs jobs on a pool of workers: jobs with the same key run one at a time in order,
+# jobs with different keys run in parallel
+class CommandScheduler:
+    def __init__(self, workers):
+        self.workers = workers
+        self.pending = {}  # Key -> deque of jobs waiting behind the running one
+        self.ready = asyncio.Queue()  # Keys with a job ready to start
+
+    # Queue a zero-argument coroutine function behind earlier jobs with the same key
+    def submit(self, key, job):
+        jobs = self.pending.get(key)
+        if jobs is None:
+            self.pending[key] = deque([job])
+            self.ready.put_nowait(key)
+        else:
+            jobs.append(job)
+
+    # Queue a job like submit and wait for its result, raising what the job raised
+    async def call(self, key, job):
+        future = asyncio.get_running_loop().create_future()
+
+        async def run():
+            try:
+                result = await job()
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            if not future.done():
+                future.set_result(result)
+
+        self.submit(key, run)
+        return await future
+
+    # Jobs waiting to start
+    def depth(self):
+        return sum(len(jobs) for jobs in self.pending.values())
+
+    async def worker(self):
+        while True:
+            key = await self.ready.get()
+            jobs = self.pending[key]
+            job = jobs.popleft()
+            try:
+                await job()
+            except Exception as e:
+                logging.error(f"Error running {key} job: {e}")
+            if jobs:
+                self.ready.put_nowait(key)
+            else:
+                del self.pending[key]
+
+    async def run(self):
+        await asyncio.gather(*(self.worker() for _ in range(self.workers)))
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import asyncio
+import logging
+
+INFO_FILE = 'exchange_info.json'
+INFO_TTL = 3600  # Seconds before exchange info is refreshed in the background
+MISS_REFRESH_INTERVAL = 60  # Minimum seconds between refreshes caused by unknown symbols
+
+# Number of decimals in a filter step such as '0.00100'
+def decimals(step):
+    step = step.rstrip('0')
+    return len(step.split('.')[1]) if '.' in step else 0
+
+# Symbol metadata from futures exchange info, indexed by symbol
+class SymbolInfoCache:
+    def __init__(self, client, path=INFO_FILE, ttl=INFO_TTL):
+        self.client = client
+        self.path = path
+        self.ttl = ttl
+        self.symbols = {}
+        self.loaded_at = 0
+        self.last_miss_refresh = 0
+        self.lock = asyncio.Lock()
+
+    def parse(self, info):
+        symbols = {}
+        for s in info['symbols']:
+            filters = {f['filterType']: f for f in s['filters']}
+            price_filter = filters.get('PRICE_FILTER', {})
+            lot_filter = filters.get('LOT_SIZE', {})
+            symbols[s['symbol']] = {
+                'status': s['status'],
+                'quantity_precision': int(s['quantityPrecision']),
+                'price_precision': decimals(price_filter.get('tickSize', '1')),
+                'tick_size': float(price_filter.get('tickSize', 0)),
+                'step_size': float(lot_filter.get('stepSize', 0)),
+                'min_notional': float(filters.get('MIN_NOTIONAL', {}).get('notional', 0)),
+            }
+        return symbols
+
+    # Warm start from the copy saved by the last refresh
+    def load_file(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.symbols = data['symbols']
+            self.loaded_at = data['loaded_at']
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"Error loading exchange info cache: {e}")
+
+    def save_file(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'loaded_at': self.loaded_at, 'symbols': self.symbols}, f)
+        os.replace(tmp_path, self.path)
+
+    def stale(self):
+        return time.time() - self.loaded_at > self.ttl
+
+    async def refresh(self):
+        async with self.lock:
+            info = await self.client.futures_exchange_info()
+            self.symbols = self.parse(info)
+            self.loaded_at = time.time()
+        try:
+            await asyncio.to_thread(self.save_file)
+        except OSError as e:
+            logging.error(f"Error saving exchange info cache: {e}")
+
+    async def get(self, symbol):
+        if symbol not in self.symbols and time.time() - self.last_miss_refresh > MISS_REFRESH_INTERVAL:
+            self.last_miss_refresh = time.time()  # Could be a new listing
+            await self.refresh()
+        return self.symbols.get(symbol)
+
+    async def start(self):
+        self.load_file()
+        if not self.symbols or self.stale():
+            await self.refresh()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(max(self.ttl - (time.time() - self.loaded_at), 1))
+            try:
+                await self.refresh()
+            except Exception as e:
+                logging.error(f"Error refreshing exchange info: {e}")
+                await asyncio.sleep(MISS_REFRESH_INTERVAL)